@@ -1,12 +1,16 @@
 # 教育辅助可视分析系统 - 后端入口
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, make_response
 from flask_cors import CORS
 import os
 import json
+import hashlib
+import functools
 import pandas as pd
 import numpy as np
-from services.data_service import DataService
+from services.data_service import get_data_service, DEFAULT_PAGE_SIZE
+from services.json_provider import FastJSONProvider
+from services.arrow_export import ARROW_AVAILABLE, ARROW_STREAM_MIMETYPE, frame_to_ipc, iter_ipc_stream
 from services.analysis_service import AnalysisService
 from services.report_service import ReportService
 from services.nlp_service import NLPService
@@ -14,16 +18,51 @@ from services.templates import TemplateService
 from services.ai_report_service import AIReportService
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # 所有接口的JSON响应直接序列化numpy、pandas类型
 CORS(app)  # 启用跨域请求支持
 
-# 初始化服务
-data_service = DataService()
-analysis_service = AnalysisService()
-report_service = ReportService()
+# 初始化服务（所有服务共享同一个数据服务实例）
+data_service = get_data_service()
+analysis_service = AnalysisService(data_service)
+report_service = ReportService(data_service, analysis_service)
 # nlp_service 将在需要时动态创建
 template_service = TemplateService()
 ai_report_service = AIReportService()
 
+def is_error_response(response):
+    """分析接口出错时返回200和status为error的JSON，这类结果不参与条件GET"""
+    if response.is_streamed or not response.is_json:
+        return False
+    body = response.get_json(silent=True)
+    return isinstance(body, dict) and body.get('status') == 'error'
+
+# 条件GET：响应只取决于数据版本和请求参数，ETag由二者计算，
+# 客户端携带相同的If-None-Match时直接返回304，不再计算和传输结果
+def versioned_etag(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        data_service.refresh_if_changed()
+        version = data_service.data_version
+        params = sorted(request.args.items(multi=True))
+        key = repr((version, request.path, params, wants_arrow()))
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or is_error_response(response):
+                return response
+            # 计算期间数据已更新时，结果可能来自新版本，不能打上旧版本的ETag
+            if data_service.data_version != version:
+                return response
+        response.set_etag(etag)
+        # 每次使用前向服务器验证，数据变化后客户端立即得到新结果
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept')
+        return response
+    return wrapper
+
 # 根路由
 @app.route('/')
 def index():
@@ -34,83 +73,236 @@ def index():
 
 # 获取学生信息
 @app.route('/api/students', methods=['GET'])
+@versioned_etag
 def get_students():
     students = data_service.get_students()
     return jsonify(students)
 
 # 获取题目信息
 @app.route('/api/questions', methods=['GET'])
+@versioned_etag
 def get_questions():
     questions = data_service.get_questions()
     return jsonify(questions)
 
-# 获取提交记录
+# 是否请求Arrow格式（format=arrow或Accept头优先Arrow IPC流），默认仍为JSON
+def wants_arrow():
+    if request.args.get('format') == 'arrow':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', ARROW_STREAM_MIMETYPE]) == ARROW_STREAM_MIMETYPE
+
+# 未安装pyarrow时Arrow格式不可用
+def arrow_unavailable_response():
+    return jsonify({
+        'status': 'error',
+        'message': '服务器未安装pyarrow，不支持Arrow格式'
+    }), 406
+
+# 将分析结果中的DataFrame按Arrow IPC流返回，分析出错时仍返回JSON
+def arrow_frame_response(result):
+    if result['status'] == 'error':
+        return jsonify(result)
+    return Response(frame_to_ipc(result['frame']), mimetype=ARROW_STREAM_MIMETYPE)
+
+# 提交记录查询的筛选参数（start_time、end_time为Unix时间戳），筛选通过数据服务的索引完成
+def get_submission_filters():
+    filters = {name: request.args.get(name)
+               for name in ('class_id', 'student_id', 'title_id', 'state', 'knowledge', 'sub_knowledge')}
+    for name in ('start_time', 'end_time'):
+        value = request.args.get(name)
+        if value is not None:
+            try:
+                filters[name] = int(value)
+            except ValueError:
+                # 时间参数无法解析时报错，不能当作未指定而返回未筛选的结果
+                raise ValueError(f'{name}应为整数Unix时间戳')
+    return {name: value for name, value in filters.items() if value is not None}
+
+# 是否请求了游标分页或流式输出
+def is_submission_query():
+    return any(name in request.args for name in ('cursor', 'limit', 'format')) or wants_arrow()
+
+# 按查询参数返回Arrow IPC流（format=arrow）、NDJSON流（format=ndjson）或游标分页结果（cursor、limit）
+def submission_query_response():
+    try:
+        filters = get_submission_filters()
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if wants_arrow():
+        if not ARROW_AVAILABLE:
+            return arrow_unavailable_response()
+        # 合并表的行切片按列写出，分类列保持字典编码
+        empty_frame = data_service.get_all_submissions_df().iloc[0:0]
+        frames = data_service.iter_submission_frames(filters)
+        return Response(stream_with_context(iter_ipc_stream(frames, empty_frame)), mimetype=ARROW_STREAM_MIMETYPE)
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            for batch in data_service.iter_submission_batches(filters):
+                yield ''.join(app.json.dumps(record, sort_keys=False) + '\n' for record in batch)
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    result = data_service.get_submission_page(
+        filters, cursor=request.args.get('cursor'), limit=request.args.get('limit', DEFAULT_PAGE_SIZE, type=int))
+    if result['status'] == 'error':
+        return jsonify(result), 400
+    return jsonify(result)
+
+# 获取提交记录（指定cursor、limit或format时按筛选条件分页或流式输出）
 @app.route('/api/submissions', methods=['GET'])
+@versioned_etag
 def get_submissions():
+    if is_submission_query():
+        return submission_query_response()
     class_id = request.args.get('class_id', 'Class1')
     student_id = request.args.get('student_id', None)
     submissions = data_service.get_submissions(class_id, student_id)
     return jsonify(submissions)
 
-# 获取所有班级的提交记录
+# 分页获取所有班级的提交记录（指定cursor、limit或format时按筛选条件分页或流式输出）
 @app.route('/api/all_submissions', methods=['GET'])
+@versioned_etag
 def get_all_submissions():
-    submissions = data_service.get_all_submissions()
-    return jsonify(submissions)
+    if is_submission_query():
+        return submission_query_response()
+    page = request.args.get('page', 1, type=int)
+    page_size = request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int)
+    result = data_service.get_all_submissions(page=page, page_size=page_size)
+    if result['status'] == 'error':
+        return jsonify(result), 400
+    return jsonify(result)
+
+# 仪表盘概览（由预聚合数据计算的汇总统计）
+@app.route('/api/dashboard/summary', methods=['GET'])
+@versioned_etag
+def get_dashboard_summary():
+    result = analysis_service.get_dashboard_summary()
+    return jsonify(result)
+
+# 批量追加提交记录（增量更新聚合数据，无需重启服务）
+@app.route('/api/submissions/batch', methods=['POST'])
+def append_submissions():
+    data = request.get_json(silent=True)
+    records = data.get('records') if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        return jsonify({
+            'status': 'error',
+            'message': '请求体应为提交记录列表或包含records列表的对象'
+        }), 400
+    
+    result = data_service.append_submissions(records)
+    if result['status'] == 'error':
+        return jsonify(result), 400
+    return jsonify(result)
+
+# 获取数据缓存状态（内存占用、分析结果缓存命中情况）
+@app.route('/api/data/stats', methods=['GET'])
+def get_data_stats():
+    return jsonify({
+        'status': 'success',
+        'memory_usage': data_service.get_memory_usage(),
+        'result_cache': analysis_service.result_cache.stats()
+    })
 
 # 知识点掌握度分析
 @app.route('/api/analysis/knowledge', methods=['GET'])
+@versioned_etag
 def analyze_knowledge():
     student_id = request.args.get('student_id', None)
-    result = analysis_service.analyze_knowledge_mastery(student_id)
+    class_id = request.args.get('class_id', None)
+    result = analysis_service.analyze_knowledge_mastery(student_id, class_id=class_id)
     return jsonify(result)
 
 # 知识点掌握度时序数据
 @app.route('/api/analysis/knowledge/timeseries', methods=['GET'])
+@versioned_etag
 def analyze_knowledge_timeseries():
     student_id = request.args.get('student_id', None)
-    result = analysis_service.analyze_knowledge_mastery_timeseries(student_id)
+    # 可选：columnar并列数组或arrow输出、hour/day/week时间分桶、LTTB降采样的最大点数
+    output_format = request.args.get('format', 'records')
+    bucket = request.args.get('bucket', None)
+    max_points = request.args.get('max_points', None, type=int)
+    if wants_arrow():
+        if not ARROW_AVAILABLE:
+            return arrow_unavailable_response()
+        result = analysis_service.analyze_knowledge_mastery_timeseries_frame(
+            student_id, bucket=bucket, max_points=max_points)
+        return arrow_frame_response(result)
+    result = analysis_service.analyze_knowledge_mastery_timeseries(
+        student_id, format=output_format, bucket=bucket, max_points=max_points)
     return jsonify(result)
 
 # 学习行为模式分析
 @app.route('/api/analysis/behavior', methods=['GET'])
+@versioned_etag
 def analyze_behavior():
     student_id = request.args.get('student_id', None)
-    result = analysis_service.analyze_learning_behavior(student_id)
+    class_id = request.args.get('class_id', None)
+    result = analysis_service.analyze_learning_behavior(student_id, class_id=class_id)
     return jsonify(result)
 
 # 题目难度分析
 @app.route('/api/analysis/difficulty', methods=['GET'])
+@versioned_etag
 def analyze_difficulty():
-    result = analysis_service.analyze_question_difficulty()
-    # 递归转换 numpy.int64 为 int
-    def convert_np(obj):
-        import numpy as np
-        if isinstance(obj, dict):
-            return {k: convert_np(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [convert_np(i) for i in obj]
-        elif isinstance(obj, np.integer):
-            return int(obj)
-        elif isinstance(obj, np.floating):
-            return float(obj)
-        else:
-            return obj
-    result = convert_np(result)
+    class_id = request.args.get('class_id', None)
+    if wants_arrow():
+        if not ARROW_AVAILABLE:
+            return arrow_unavailable_response()
+        return arrow_frame_response(analysis_service.analyze_question_difficulty_frame(class_id=class_id))
+    result = analysis_service.analyze_question_difficulty(class_id=class_id)
     return jsonify(result)
 
 # 知识点散点图数据分析
 @app.route('/api/analysis/knowledge-scatter', methods=['GET'])
+@versioned_etag
 def analyze_knowledge_scatter():
     result = analysis_service.analyze_knowledge_scatter_data()
     return jsonify(result)
 
 # 子知识点散点图数据分析
 @app.route('/api/analysis/sub-knowledge-scatter', methods=['GET'])
+@versioned_etag
 def analyze_sub_knowledge_scatter():
     result = analysis_service.analyze_sub_knowledge_scatter_data()
     return jsonify(result)
 
+# 跨班级对比（班级×知识点的掌握程度、正确率和提交次数矩阵）
+@app.route('/api/analysis/class-comparison', methods=['GET'])
+@versioned_etag
+def analyze_class_comparison():
+    result = analysis_service.analyze_class_comparison()
+    return jsonify(result)
+
+# 批量分析多个学生（一次请求返回每个学生的多种分析结果）
+@app.route('/api/analysis/batch', methods=['POST'])
+def analyze_batch():
+    data = request.get_json(silent=True) or {}
+    student_ids = data.get('student_ids')
+    analysis_types = data.get('analysis_types', ['knowledge', 'behavior', 'timeseries'])
+    max_points = data.get('max_points')
+    if not isinstance(student_ids, list) or not isinstance(analysis_types, list):
+        return jsonify({
+            'status': 'error',
+            'message': 'student_ids和analysis_types应为列表'
+        }), 400
+    if max_points is not None and not isinstance(max_points, int):
+        return jsonify({'status': 'error', 'message': 'max_points应为整数'}), 400
+    
+    # 时序分析的可选参数与/api/analysis/knowledge/timeseries相同
+    result = analysis_service.analyze_batch(
+        [str(student_id) for student_id in student_ids], analysis_types,
+        format=data.get('format', 'records'), bucket=data.get('bucket'), max_points=max_points)
+    if result['status'] == 'error':
+        return jsonify(result), 400
+    return jsonify(result)
+
+# 知识点、子知识点和题目散点图数据（一次请求返回三个层级）
+@app.route('/api/analysis/scatter', methods=['GET'])
+@versioned_etag
+def analyze_scatter():
+    result = analysis_service.analyze_scatter_data()
+    return jsonify(result)
+
 # 生成报告
 @app.route('/api/report/generate', methods=['POST'])
 def generate_report():
@@ -183,8 +375,10 @@ def nlp_query():
     api_key = data.get('api_key')  # 从前端获取API密钥
     base_url = data.get('base_url')  # 从前端获取基础URL
     
-    # 创建NLPService实例，传入API配置
-    nlp_service = NLPService(api_key=api_key, base_url=base_url)
+    # 创建NLPService实例，传入API配置并复用共享的分析和报告服务
+    nlp_service = NLPService(api_key=api_key, base_url=base_url,
+                             analysis_service=analysis_service,
+                             report_service=report_service)
     result = nlp_service.process_query(query)
     return jsonify(result)
 
@@ -329,10 +523,11 @@ def generate_ai_report():
                 difficulty_data=difficulty_data
             )
         else:
-            # 班级报告或其他情况
+            # 班级报告或其他情况：分析数据由服务端按班级计算，不使用客户端拼装的数据
+            class_ids = [str(target) for target in targets] if scope == 'class' else []
             result = ai_report_service.generate_class_report(
                 class_data=targets,
-                analysis_data=analysis_data
+                analysis_data=analysis_service.get_class_report_data(class_ids, analysis_types)
             )
         
         return jsonify(result)
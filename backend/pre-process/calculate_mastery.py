@@ -1,120 +1,176 @@
 import pandas as pd
 import numpy as np
 import os
+import sys
+import json
+import time
+import argparse
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
-def calculate_mastery(state, score, total_score):
+# 掌握度计算规则由services.mastery统一提供，预处理与数据服务共用
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from services.mastery import compute_submission_mastery, title_total_scores  # noqa: E402
+from services.submission_cache import file_sha256  # noqa: E402
+
+# 默认数据目录：项目根目录下的Data
+DEFAULT_DATA_ROOT = Path(__file__).resolve().parents[2] / "Data"
+
+# 预处理清单，记录每个文件处理后的内容哈希及所用题目信息的哈希
+MANIFEST_NAME = "mastery_manifest.json"
+
+def read_manifest(manifest_path):
+    """读取预处理清单"""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def write_manifest(manifest_path, manifest):
+    """原子写入预处理清单（临时文件+重命名）"""
+    os.makedirs(manifest_path.parent, exist_ok=True)
+    tmp_path = manifest_path.with_name(f"{manifest_path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def process_submit_file(file_path, title_scores):
     """
-    根据分段计算法计算学生对题目的掌握程度
-    
+    计算单个提交记录文件的Mastery列并原子写回
+
     Args:
-        state: 答题状态
-        score: 获得分数
-        total_score: 题目总分
-    
+        file_path: 提交记录CSV路径
+        title_scores: 题目ID到总分的映射
+
     Returns:
-        掌握程度值 (0.0-1.0)
+        处理结果字典（文件名、记录数、写入后的内容哈希、耗时和统计信息）
     """
-    # 处理缺失值和异常值
-    if pd.isna(state) or pd.isna(score) or pd.isna(total_score):
-        return 0.0
-    
-    # 确保分数为数值类型
+    start = time.perf_counter()
+    file_path = Path(file_path)
     try:
-        score = float(score)
-        total_score = float(total_score)
-    except (ValueError, TypeError):
-        return 0.0
-    
-    # 计算分数占比
-    score_ratio = score / total_score if total_score > 0 else 0.0
-    
-    # 处理状态字符串，去除可能的空格和转换为字符串
-    state = str(state).strip()
-    
-    # 分段计算掌握程度
-    if state == "Absolutely_Correct":
-        return 1.0
-    elif state == "Partially_Correct":
-        return score_ratio
-    elif state.startswith("Error") and state != "Absolutely_Error":
-        # Error1, Error2, ..., Error9
-        return 0.1 + 0.2 * score_ratio
-    else:  # Absolutely_Error 或其他未知状态
-        return 0.0
-
-def process_submit_records():
+        # 读取提交记录并向量化计算掌握程度
+        df = pd.read_csv(file_path)
+        had_mastery = 'Mastery' in df.columns
+        df['Mastery'] = compute_submission_mastery(df, title_scores)
+
+        # 先写临时文件再重命名，避免中断时留下不完整的CSV
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+        df.to_csv(tmp_path, index=False)
+        sha256 = file_sha256(tmp_path)
+        os.replace(tmp_path, file_path)
+
+        return {
+            'file': file_path.name,
+            'status': 'processed',
+            'rows': len(df),
+            'had_mastery': had_mastery,
+            'sha256': sha256,
+            'mean': float(df['Mastery'].mean()) if len(df) else 0.0,
+            'min': float(df['Mastery'].min()) if len(df) else 0.0,
+            'max': float(df['Mastery'].max()) if len(df) else 0.0,
+            'elapsed': time.perf_counter() - start,
+        }
+    except Exception as e:
+        return {
+            'file': file_path.name,
+            'status': 'failed',
+            'rows': 0,
+            'error': str(e),
+            'elapsed': time.perf_counter() - start,
+        }
+
+def process_submit_records(data_root=DEFAULT_DATA_ROOT, workers=None, force=False):
     """
     处理所有提交记录文件，添加Mastery列
+
+    内容哈希与清单一致（且题目信息未变化）的文件直接跳过，其余文件在进程池中并行处理。
+
+    Args:
+        data_root: 数据根目录（包含Data_TitleInfo.csv和Data_SubmitRecord）
+        workers: 进程数，为None时使用CPU核数
+        force: 为True时忽略清单，全部重新计算
+
+    Returns:
+        处理汇总字典
     """
-    # 数据目录路径
-    data_dir = Path("d:/Vscode/Project/VisualAnalytics/EduAssistSys/Data")
+    start = time.perf_counter()
+    data_dir = Path(data_root)
     submit_dir = data_dir / "Data_SubmitRecord"
     title_info_path = data_dir / "Data_TitleInfo.csv"
-    
+    manifest_path = data_dir / "Cache" / MANIFEST_NAME
+
     # 读取题目信息
     print("正在读取题目信息...")
     title_info = pd.read_csv(title_info_path)
-    
-    # 创建题目ID到总分的映射字典
-    title_scores = {}
-    for _, row in title_info.iterrows():
-        title_id = row['title_ID']
-        score = row['score']
-        if title_id not in title_scores:
-            title_scores[title_id] = score
-        else:
-            # 如果同一题目有多个记录，取最大分数
-            title_scores[title_id] = max(title_scores[title_id], score)
-    
+    title_sha256 = file_sha256(title_info_path)
+
+    # 创建题目ID到总分的映射（同一题目有多个记录时取最大分数）
+    title_scores = title_total_scores(title_info)
+
     print(f"共找到 {len(title_scores)} 个题目的分数信息")
-    
-    # 处理所有提交记录文件
-    submit_files = list(submit_dir.glob("SubmitRecord-*.csv"))
+
+    # 筛选内容有变化的提交记录文件
+    submit_files = sorted(submit_dir.glob("SubmitRecord-*.csv"))
     print(f"找到 {len(submit_files)} 个提交记录文件")
-    
+
+    manifest = {} if force else read_manifest(manifest_path)
+    pending = []
+    skipped = []
     for file_path in submit_files:
-        print(f"\n正在处理文件: {file_path.name}")
-        
-        try:
-            # 读取提交记录
-            df = pd.read_csv(file_path)
-            print(f"  - 原始记录数: {len(df)}")
-            
-            # 检查是否已存在Mastery列
-            if 'Mastery' in df.columns:
-                print("  - Mastery列已存在，将重新计算")
-            
-            # 计算掌握程度
-            mastery_values = []
-            for _, row in df.iterrows():
-                title_id = row['title_ID']
-                state = row['state']
-                score = row['score']
-                
-                # 获取题目总分
-                total_score = title_scores.get(title_id, 0)
-                
-                # 计算掌握程度
-                mastery = calculate_mastery(state, score, total_score)
-                mastery_values.append(mastery)
-            
-            # 添加Mastery列
-            df['Mastery'] = mastery_values
-            
-            # 保存文件
-            df.to_csv(file_path, index=False)
-            print(f"  - 已添加Mastery列并保存")
-            
-            # 显示统计信息
-            mastery_stats = pd.Series(mastery_values).describe()
-            print(f"  - Mastery统计: 平均值={mastery_stats['mean']:.3f}, 最小值={mastery_stats['min']:.3f}, 最大值={mastery_stats['max']:.3f}")
-            
-        except Exception as e:
-            print(f"  - 处理文件时出错: {str(e)}")
+        entry = manifest.get(file_path.name)
+        if (entry and entry.get('title_sha256') == title_sha256
+                and entry.get('sha256') == file_sha256(file_path)):
+            skipped.append(file_path.name)
+        else:
+            pending.append(file_path)
+    if skipped:
+        print(f"跳过 {len(skipped)} 个未变化的文件")
+
+    results = []
+    if pending:
+        max_workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        print(f"使用 {max_workers} 个进程处理 {len(pending)} 个文件")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(process_submit_file, pending, [title_scores] * len(pending)))
+
+    for result in results:
+        print(f"\n文件: {result['file']}")
+        if result['status'] != 'processed':
+            print(f"  - 处理文件时出错: {result['error']}")
+            manifest.pop(result['file'], None)
             continue
-    
-    print("\n所有文件处理完成！")
+        if result['had_mastery']:
+            print("  - Mastery列已存在，已重新计算")
+        print(f"  - 记录数: {result['rows']}，耗时 {result['elapsed']:.2f}s")
+        print(f"  - Mastery统计: 平均值={result['mean']:.3f}, 最小值={result['min']:.3f}, 最大值={result['max']:.3f}")
+        manifest[result['file']] = {
+            'sha256': result['sha256'],
+            'title_sha256': title_sha256,
+            'rows': result['rows'],
+        }
+    write_manifest(manifest_path, manifest)
+
+    summary = {
+        'processed': sum(1 for r in results if r['status'] == 'processed'),
+        'skipped': len(skipped),
+        'failed': sum(1 for r in results if r['status'] != 'processed'),
+        'rows': sum(r['rows'] for r in results),
+        'elapsed': time.perf_counter() - start,
+    }
+    print(f"\n处理完成：处理 {summary['processed']} 个文件（{summary['rows']} 条记录），"
+          f"跳过 {summary['skipped']} 个，失败 {summary['failed']} 个，总耗时 {summary['elapsed']:.2f}s")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="计算提交记录的掌握程度（Mastery列）")
+    parser.add_argument("--data-root", default=str(DEFAULT_DATA_ROOT), help="数据根目录（包含Data_TitleInfo.csv和Data_SubmitRecord）")
+    parser.add_argument("--workers", type=int, default=None, help="并行处理的进程数，默认为CPU核数")
+    parser.add_argument("--force", action="store_true", help="忽略清单，全部重新计算")
+    args = parser.parse_args()
+
+    summary = process_submit_records(args.data_root, workers=args.workers, force=args.force)
+    return 1 if summary['failed'] else 0
 
 if __name__ == "__main__":
-    process_submit_records()
\ No newline at end of file
+    sys.exit(main())
@@ -3,15 +3,16 @@
 import re
 import json
 import numpy as np
-from services.data_service import DataService
+from services.data_service import get_data_service
 from services.analysis_service import AnalysisService
 from services.report_service import ReportService
 
 class NLPService:
-    def __init__(self):
-        self.data_service = DataService()
-        self.analysis_service = AnalysisService()
-        self.report_service = ReportService()
+    def __init__(self, analysis_service=None, report_service=None):
+        # 默认使用进程内共享的数据服务，分析和报告服务可由调用方复用
+        self.data_service = get_data_service()
+        self.analysis_service = analysis_service or AnalysisService(self.data_service)
+        self.report_service = report_service or ReportService(self.data_service, self.analysis_service)
         
         # 定义关键词和对应的处理函数
         self.keywords = {
@@ -0,0 +1,301 @@
+# 聚合立方体模块 - 预聚合提交记录的充分统计量，供各分析接口上卷使用
+
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from services.submission_cache import CACHE_FORMAT
+
+# 立方体的维度和度量列
+CUBE_DIMENSIONS = ['student_ID', 'class', 'knowledge', 'sub_knowledge', 'title_ID', 'day', 'hour', 'primary']
+CUBE_MEASURES = ['count', 'correct', 'mastery_sum', 'mastery_count',
+                 'timeconsume_sum', 'timeconsume_count', 'memory_sum', 'memory_count']
+CATEGORICAL_DIMENSIONS = ['student_ID', 'class', 'knowledge', 'sub_knowledge', 'title_ID']
+
+# 增量单元格总数超过基础单元格的该比例时合并为新的基础单元格
+COMPACT_RATIO = 0.1
+
+# 持久化文件名及格式版本（立方体结构变化时递增，使旧文件失效）
+CUBE_NAME = 'aggregate_cube'
+CUBE_FORMAT_VERSION = 1
+
+BEIJING_UTC_OFFSET = 8 * 3600
+
+
+class AggregateCube:
+    """提交记录的多维预聚合立方体
+
+    每个单元格对应 学生×班级×知识点×从属知识点×题目×日期×小时 的一个组合，保存计算均值和比率
+    所需的充分统计量：提交数、正确提交数、Mastery和/计数、用时和/计数、内存（仅正值）和/计数。
+    多知识点题目的提交会出现在多个知识点下，primary标记提交关联的第一条题目信息，
+    按提交计数的统计（题目、行为等）只使用primary单元格，避免重复计数。
+    
+    新提交以增量单元格段的形式追加（append），上卷时各段分别聚合后按维度取值合并；
+    增量累积到一定规模后与基础单元格合并。立方体对象创建后不再修改，追加返回新对象，
+    读者持有的旧对象始终是一致的快照。分类维度的取值有序，各段单元格按维度取值排序，
+    便于按学生切片。
+    """
+
+    def __init__(self, cells, deltas=()):
+        """
+        Args:
+            cells: 基础单元格
+            deltas: 追加的增量单元格段
+        """
+        self.cells = cells
+        self.deltas = tuple(deltas)
+        self._student_codes = [self._codes(segment) for segment in self.segments]
+
+    @property
+    def segments(self):
+        """基础单元格及全部增量段"""
+        return (self.cells,) + self.deltas
+
+    @staticmethod
+    def _codes(segment):
+        if segment.empty:
+            return np.array([], dtype=np.int64)
+        return segment['student_ID'].cat.codes.to_numpy()
+
+    @classmethod
+    def build(cls, fact, n_submissions):
+        """
+        从事实表构建立方体
+
+        Args:
+            fact: 提交记录关联题目信息的事实表（前n_submissions行为每条提交的第一条关联记录）
+            n_submissions: 提交记录数
+
+        Returns:
+            AggregateCube实例
+        """
+        if fact.empty:
+            return cls(pd.DataFrame(columns=CUBE_DIMENSIONS + CUBE_MEASURES))
+
+        start = time.perf_counter()
+        timestamps = fact['time'].to_numpy(np.int64)
+        mastery = fact['Mastery'].to_numpy(np.float64)
+        timeconsume = fact['timeconsume'].to_numpy(np.float64)
+        memory = fact['memory'].to_numpy(np.float64)
+        positive_memory = memory > 0
+
+        rows = pd.DataFrame({
+            'student_ID': fact['student_ID'],
+            'class': fact['class'],
+            'knowledge': fact['knowledge'],
+            'sub_knowledge': fact['sub_knowledge'],
+            'title_ID': fact['title_ID'],
+            # 北京时间自1970-01-01起的天数
+            'day': ((timestamps + BEIJING_UTC_OFFSET) // 86400).astype(np.int32),
+            'hour': fact['hour'].to_numpy(np.int8),
+            'primary': np.arange(len(fact)) < n_submissions,
+            'count': np.ones(len(fact), dtype=np.int32),
+            'correct': (fact['state'] == 'Absolutely_Correct').to_numpy(np.int32),
+            'mastery_sum': np.nan_to_num(mastery),
+            'mastery_count': (~np.isnan(mastery)).astype(np.int32),
+            'timeconsume_sum': np.nan_to_num(timeconsume),
+            'timeconsume_count': (~np.isnan(timeconsume)).astype(np.int32),
+            'memory_sum': np.where(positive_memory, memory, 0.0),
+            'memory_count': positive_memory.astype(np.int32),
+        })
+        cells = cls._aggregate_cells(rows)
+        if len(fact) >= 10000:
+            print(f"已构建{len(cells)}个单元格的聚合立方体，耗时{time.perf_counter() - start:.2f}s")
+        return cls(cells)
+
+    @staticmethod
+    def _aggregate_cells(rows):
+        """按全部维度聚合度量，分类维度使用有序的取值"""
+        for dimension in CATEGORICAL_DIMENSIONS:
+            if not isinstance(rows[dimension].dtype, pd.CategoricalDtype):
+                rows[dimension] = rows[dimension].astype('category')
+        cells = rows.groupby(CUBE_DIMENSIONS, observed=True, sort=True)[CUBE_MEASURES].sum().reset_index()
+        return cells.astype({measure: np.int32 for measure in CUBE_MEASURES if not measure.endswith('_sum')})
+
+    def append(self, delta):
+        """
+        追加增量立方体（如新提交记录构建的立方体），返回新的立方体对象
+
+        耗时与增量规模成正比；增量累积超过基础单元格的COMPACT_RATIO时合并为新的基础单元格。
+
+        Args:
+            delta: 新数据的AggregateCube
+
+        Returns:
+            包含增量的新AggregateCube，原对象不变
+        """
+        deltas = self.deltas + tuple(segment for segment in delta.segments if not segment.empty)
+        if sum(len(segment) for segment in deltas) > COMPACT_RATIO * max(len(self.cells), 1):
+            return AggregateCube(self._merge_segments((self.cells,) + deltas))
+        return AggregateCube(self.cells, deltas)
+
+    @classmethod
+    def _merge_segments(cls, segments):
+        """合并多个单元格段，分类维度取值取并集（有序）"""
+        segments = [segment for segment in segments if not segment.empty]
+        if not segments:
+            return pd.DataFrame(columns=CUBE_DIMENSIONS + CUBE_MEASURES)
+        if len(segments) == 1:
+            return segments[0]
+        rows = pd.concat([segment.astype({dimension: object for dimension in CATEGORICAL_DIMENSIONS})
+                          for segment in segments], ignore_index=True)
+        return cls._aggregate_cells(rows)
+
+    def compacted(self):
+        """将增量段合并后的立方体"""
+        if not self.deltas:
+            return self
+        return AggregateCube(self._merge_segments(self.segments))
+
+    @property
+    def empty(self):
+        return all(segment.empty for segment in self.segments)
+
+    def for_student(self, student_id):
+        """获取只包含指定学生的子立方体，学生不存在时为空立方体"""
+        parts = []
+        for segment, codes in zip(self.segments, self._student_codes):
+            if segment.empty:
+                continue
+            code = segment['student_ID'].cat.categories.get_indexer([student_id])[0]
+            start, stop = np.searchsorted(codes, [code, code + 1]) if code >= 0 else (0, 0)
+            parts.append(segment.iloc[start:stop])
+        if not parts:
+            return AggregateCube(self.cells.iloc[0:0])
+        return AggregateCube(parts[0], parts[1:])
+
+    def for_class(self, class_id):
+        """获取只包含指定班级的子立方体（各段内仍按学生排序），班级不存在时为空立方体"""
+        parts = [segment[segment['class'] == class_id] for segment in self.segments if not segment.empty]
+        if not parts:
+            return AggregateCube(self.cells.iloc[0:0])
+        return AggregateCube(parts[0], parts[1:])
+    
+    def for_students(self, student_ids):
+        """获取只包含指定学生的子立方体（各段内仍按学生排序），不存在的学生忽略"""
+        parts = []
+        for segment, codes in zip(self.segments, self._student_codes):
+            if segment.empty:
+                continue
+            student_codes = np.unique(segment['student_ID'].cat.categories.get_indexer(list(student_ids)))
+            student_codes = student_codes[student_codes >= 0]
+            starts = np.searchsorted(codes, student_codes)
+            stops = np.searchsorted(codes, student_codes + 1)
+            rows = np.concatenate([np.arange(start, stop) for start, stop in zip(starts, stops)] + [[]]).astype(np.int64)
+            parts.append(segment.take(rows))
+        if not parts:
+            return AggregateCube(self.cells.iloc[0:0])
+        return AggregateCube(parts[0], parts[1:])
+    
+    def rollup(self, dimensions, primary_only=False):
+        """
+        按指定维度上卷，汇总各度量
+
+        Args:
+            dimensions: 上卷后保留的维度列表
+            primary_only: 为True时只统计每条提交的第一条关联记录（按提交计数）
+
+        Returns:
+            以维度为索引（按维度取值排序）的度量汇总DataFrame
+        """
+        parts = []
+        for segment in self.segments:
+            if segment.empty:
+                continue
+            cells = segment[segment['primary']] if primary_only else segment
+            parts.append(cells.groupby(dimensions, observed=True, sort=True)[CUBE_MEASURES].sum())
+        if not parts:
+            return pd.DataFrame(columns=CUBE_MEASURES)
+        if len(parts) == 1:
+            return parts[0]
+        # 各段的分类取值可能不同，按取值合并（分类取值本身有序，按取值排序与按编码排序一致）
+        rows = pd.concat([part.reset_index().astype({dimension: object for dimension in dimensions
+                                                      if dimension in CATEGORICAL_DIMENSIONS})
+                          for part in parts], ignore_index=True)
+        return rows.groupby(dimensions, sort=True)[CUBE_MEASURES].sum()
+
+    def totals(self, primary_only=False):
+        """全部单元格的度量汇总"""
+        totals = pd.Series(0.0, index=CUBE_MEASURES)
+        for segment in self.segments:
+            cells = segment[segment['primary']] if primary_only else segment
+            totals = totals + cells[CUBE_MEASURES].sum()
+        return totals
+
+    @staticmethod
+    def mean(stats, measure):
+        """由和与计数计算均值，计数为0时为NaN"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return stats[f'{measure}_sum'] / stats[f'{measure}_count']
+
+    def memory_usage(self):
+        """立方体占用的字节数"""
+        return int(sum(segment.memory_usage(deep=True).sum() for segment in self.segments))
+
+    @staticmethod
+    def _paths(cache_dir):
+        cache_dir = Path(cache_dir)
+        suffix = '.feather' if CACHE_FORMAT == 'feather' else '.pkl'
+        return cache_dir / (CUBE_NAME + suffix), cache_dir / (CUBE_NAME + '.json')
+
+    def save(self, cache_dir, version):
+        """
+        持久化立方体（临时文件+重命名），元数据记录对应的数据版本
+
+        Args:
+            cache_dir: 缓存目录
+            version: 构建立方体时的数据版本
+        """
+        data_path, meta_path = self._paths(cache_dir)
+        cells = self.compacted().cells
+        try:
+            os.makedirs(data_path.parent, exist_ok=True)
+            tmp_path = data_path.with_name(f'{data_path.name}.{os.getpid()}.tmp')
+            if CACHE_FORMAT == 'feather':
+                cells.to_feather(tmp_path)
+            else:
+                cells.to_pickle(tmp_path)
+            os.replace(tmp_path, data_path)
+
+            tmp_path = meta_path.with_name(f'{meta_path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': version, 'format_version': CUBE_FORMAT_VERSION,
+                           'format': CACHE_FORMAT, 'cells': len(cells)}, f)
+            os.replace(tmp_path, meta_path)
+            return True
+        except Exception as e:
+            print(f"保存聚合立方体失败: {e}")
+            return False
+
+    @classmethod
+    def load(cls, cache_dir, version):
+        """
+        读取持久化的立方体
+
+        Args:
+            cache_dir: 缓存目录
+            version: 当前数据版本
+
+        Returns:
+            与数据版本一致的AggregateCube，不存在或已过期时返回None
+        """
+        data_path, meta_path = cls._paths(cache_dir)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if (meta.get('version') != version or meta.get('format_version') != CUBE_FORMAT_VERSION
+                    or meta.get('format') != CACHE_FORMAT):
+                return None
+            if CACHE_FORMAT == 'feather':
+                cells = pd.read_feather(data_path)
+            else:
+                cells = pd.read_pickle(data_path)
+        except (OSError, ValueError):
+            return None
+        except Exception as e:
+            print(f"读取聚合立方体失败: {e}")
+            return None
+        print(f"已加载{len(cells)}个单元格的聚合立方体")
+        return cls(cells)
@@ -506,6 +506,13 @@ NorthClass是一家知名的高等教育培训机构，开设了超过100门课
                 'message': f'生成学生报告失败: {str(e)}'
             }
     
+    @staticmethod
+    def _json_default(value):
+        """序列化服务端分析结果中的numpy数值"""
+        if isinstance(value, np.generic):
+            return value.item()
+        return str(value)
+    
     def generate_class_report(self, class_data, analysis_data):
         """生成班级整体报告"""
         if not self.client:
@@ -532,7 +539,7 @@ NorthClass是一家知名的高等教育培训机构，开设了超过100门课
 {json.dumps(class_data, ensure_ascii=False, indent=2) if class_data else '暂无数据'}
 
 分析数据：
-{json.dumps(analysis_data, ensure_ascii=False, indent=2) if analysis_data else '暂无数据'}
+{json.dumps(analysis_data, ensure_ascii=False, indent=2, default=self._json_default) if analysis_data else '暂无数据'}
 
 请生成一份详细的班级分析报告。
 """
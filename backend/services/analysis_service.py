@@ -4,122 +4,173 @@ import pandas as pd
 import numpy as np
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
-from services.data_service import DataService
+from services.data_service import get_data_service
+from services.aggregate_cube import AggregateCube, CUBE_MEASURES
+from services.behavior_histograms import HISTOGRAMS
+from services.result_cache import ResultCache, cached_result
 import os
+import re
+import threading
 import traceback
 
+# 知识点时序分析的输出格式和时间分桶（桶宽秒数）
+TIMESERIES_FORMATS = ('records', 'columnar')
+TIMESERIES_BUCKETS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+BEIJING_UTC_OFFSET = 8 * 3600
+
+# 批量分析支持的分析类型
+BATCH_ANALYSIS_TYPES = ('knowledge', 'behavior', 'timeseries')
+
+# 班级报告数据支持的分析类型
+CLASS_ANALYSIS_TYPES = ('knowledge', 'behavior', 'difficulty')
+
+def natural_sort_key(value):
+    """按数字大小排序的键，如Class2排在Class10之前"""
+    return [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', str(value))]
+
+def lttb_indices(x, y, threshold):
+    """Largest-Triangle-Three-Buckets降采样，返回保留点的行号
+    
+    首尾两点始终保留，中间的点均分为threshold-2个桶，每桶选取与前一个保留点
+    和下一桶均值构成三角形面积最大的点，以尽量保持折线形状。
+    
+    Args:
+        x: 升序的横坐标数组
+        y: 纵坐标数组
+        threshold: 目标点数（至少为3）
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        # 下一桶的均值点（最后一个桶使用末尾点）
+        if i + 2 < len(edges):
+            next_x = x[edges[i + 1]:edges[i + 2]].mean()
+            next_y = y[edges[i + 1]:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        prev_x, prev_y = x[selected[i]], y[selected[i]]
+        areas = np.abs((prev_x - next_x) * (y[start:stop] - prev_y) - (prev_x - x[start:stop]) * (next_y - prev_y))
+        selected[i + 1] = start + int(np.argmax(areas))
+    return selected
+
 class AnalysisService:
-    def __init__(self):
-        self.data_service = DataService()
+    def __init__(self, data_service=None, result_cache=None):
+        # 默认使用进程内共享的数据服务
+        self.data_service = data_service or get_data_service()
+        
+        # 分析结果缓存，按数据版本区分，数据重新加载或追加后清空
+        self.result_cache = result_cache or ResultCache()
+        self.data_service.add_reload_listener(self.result_cache.invalidate)
+        
+        # 全体学生基准值缓存，数据版本变化后重新计算
+        self._population_baseline = None
+        self._baseline_lock = threading.Lock()
     
-    def analyze_knowledge_mastery(self, student_id=None):
+    def get_population_baseline(self):
+        """获取全体学生的基准统计（各知识点及全局平均值）
+        
+        结果按数据版本缓存，单个学生的分析直接复用，数据文件变化后自动失效。
+        
+        Returns:
+            包含knowledge（各知识点平均掌握程度和平均正确提交率）、
+            mastery_rate（全局平均掌握程度）和avg_time_consume（全局平均用时）的字典
+        """
+        # 先访问数据以触发数据文件变化检查，再比对数据版本
+        cube = self.data_service.get_aggregate_cube()
+        version = self.data_service.data_version
+        baseline = self._population_baseline
+        if baseline is not None and baseline['version'] == version:
+            return baseline
+        
+        with self._baseline_lock:
+            baseline = self._population_baseline
+            if baseline is not None and baseline['version'] == version:
+                return baseline
+            
+            knowledge_stats = self._aggregate_knowledge_stats(cube, ['knowledge'])
+            knowledge = {
+                name: {
+                    'avg_mastery_level': float(stats['correct_rate']),
+                    'avg_correct_submission_rate': float(stats['correct_submission_rate'])
+                }
+                for name, stats in knowledge_stats.iterrows()
+            }
+            
+            # 全局平均值按提交计数
+            totals = cube.totals(primary_only=True)
+            baseline = {
+                'version': version,
+                'knowledge': knowledge,
+                'mastery_rate': AggregateCube.mean(totals, 'mastery'),
+                'avg_time_consume': AggregateCube.mean(totals, 'timeconsume')
+            }
+            self._population_baseline = baseline
+            return baseline
+    
+    @cached_result
+    def analyze_knowledge_mastery(self, student_id=None, class_id=None):
         """分析知识点掌握程度
         
         Args:
             student_id: 学生ID，如果为None则分析所有学生
+            class_id: 班级ID，未指定学生时只分析该班级（按提交记录的class列）
             
         Returns:
             知识点掌握度分析结果
         """
-        # 获取所有提交记录
-        all_submissions = pd.DataFrame(self.data_service.get_all_submissions())
-        if all_submissions.empty:
+        # 获取预聚合立方体
+        cube = self.data_service.get_aggregate_cube()
+        if cube.empty:
             return {'status': 'error', 'message': '没有找到提交记录数据'}
         
         # 获取题目信息
-        questions = pd.DataFrame(self.data_service.get_questions())
+        questions = self.data_service.get_questions_df()
         if questions.empty:
             return {'status': 'error', 'message': '没有找到题目数据'}
         
         # 如果指定了学生ID，则只分析该学生的数据
         if student_id:
-            submissions = all_submissions[all_submissions['student_ID'] == student_id]
-            if submissions.empty:
+            cube = cube.for_student(student_id)
+            if cube.empty:
                 return {'status': 'error', 'message': f'没有找到学生 {student_id} 的提交记录'}
-        else:
-            submissions = all_submissions
+        elif class_id:
+            cube = cube.for_class(class_id)
+            if cube.empty:
+                return {'status': 'error', 'message': f'没有找到班级 {class_id} 的提交记录'}
         
-        # 合并提交记录和题目信息
-        merged_data = pd.merge(submissions, questions, on='title_ID', how='left')
-
-        # 处理缺失值
-        merged_data.fillna({'knowledge': '未知'}, inplace=True)
-        merged_data.fillna({'sub_knowledge': '未知'}, inplace=True)
+        # 由立方体上卷得到知识点和从属知识点的掌握情况，再组装为嵌套结构
+        knowledge_stats = self._aggregate_knowledge_stats(cube, ['knowledge'])
+        sub_knowledge_stats = self._aggregate_knowledge_stats(cube, ['knowledge', 'sub_knowledge'])
+        result = self._knowledge_result(student_id, knowledge_stats, sub_knowledge_stats,
+                                        population=not student_id and not class_id)
+        if class_id and not student_id:
+            result['class_id'] = class_id
+        return result
+    
+    def _knowledge_result(self, student_id, knowledge_stats, sub_knowledge_stats, population=False):
+        """由知识点和从属知识点的聚合统计组装知识点掌握度分析结果
         
-        # 计算每个知识点的掌握程度
+        Args:
+            student_id: 学生ID，为None时表示全体学生或班级
+            knowledge_stats: 以知识点为索引的聚合统计
+            sub_knowledge_stats: 以(知识点, 从属知识点)为索引的聚合统计
+            population: 统计是否为全体学生（是则平均值直接取本次统计，否则取全体学生基准值）
+        """
         knowledge_mastery = {}
-        
-        # 按知识点分组
-        for knowledge, group in merged_data.groupby('knowledge'):
-            # 计算该知识点的掌握程度（基于题目Mastery值的平均）
-            if 'Mastery' in group.columns:
-                # 使用题目的Mastery值计算平均掌握程度
-                mastery_values = pd.to_numeric(group['Mastery'], errors='coerce')
-                correct_rate = mastery_values.mean() if not mastery_values.isna().all() else 0
-            else:
-                # 如果没有Mastery列，回退到原来的计算方式
-                total_score = group['score_y'].sum()  # 题目总分
-                earned_score = group['score_x'].sum()  # 获得的分数
-                correct_rate = earned_score / total_score if total_score > 0 else 0
-            
-            # 计算该知识点的提交次数和正确提交次数
-            total_submissions = len(group)
-            correct_submissions = len(group[group['state'] == 'Absolutely_Correct'])
-            
-            # 计算正确提交率
-            correct_submission_rate = correct_submissions / total_submissions if total_submissions > 0 else 0
-            
-            # 计算平均用时
-            group = group.copy()  # 创建副本以避免SettingWithCopyWarning
-            # 处理异常值，如"--"或"-"等非数值
-            group.loc[:, 'timeconsume'] = group['timeconsume'].replace(['--', '-'], np.nan).infer_objects(copy=False)
-            group.loc[:, 'timeconsume'] = pd.to_numeric(group['timeconsume'], errors='coerce')
-            avg_time_consume = group['timeconsume'].mean()
-            
-            # 存储该知识点的掌握情况
-            knowledge_mastery[knowledge] = {
-                'correct_rate': float(correct_rate),
-                'mastery_level': float(correct_rate),  # 掌握程度，与correct_rate相同但语义更明确
-                'correct_submission_rate': float(correct_submission_rate),
-                'avg_time_consume': float(avg_time_consume),
-                'total_submissions': int(total_submissions),
-                'correct_submissions': int(correct_submissions)
-            }
-            
-            # 分析该知识点的从属知识点掌握情况
-            sub_knowledge_mastery = {}
-            for sub_knowledge, sub_group in group.groupby('sub_knowledge'):
-                # 计算从属知识点的掌握程度（基于题目Mastery值的平均）
-                if 'Mastery' in sub_group.columns:
-                    # 使用题目的Mastery值计算平均掌握程度
-                    sub_mastery_values = pd.to_numeric(sub_group['Mastery'], errors='coerce')
-                    sub_correct_rate = sub_mastery_values.mean() if not sub_mastery_values.isna().all() else 0
-                else:
-                    # 如果没有Mastery列，回退到原来的计算方式
-                    sub_total_score = sub_group['score_y'].sum()
-                    sub_earned_score = sub_group['score_x'].sum()
-                    sub_correct_rate = sub_earned_score / sub_total_score if sub_total_score > 0 else 0
-                
-                sub_total_submissions = len(sub_group)
-                sub_correct_submissions = len(sub_group[sub_group['state'] == 'Absolutely_Correct'])
-                sub_correct_submission_rate = sub_correct_submissions / sub_total_submissions if sub_total_submissions > 0 else 0
-                
-                # 处理异常值，如"--"或"-"等非数值
-                sub_group = sub_group.copy()  # 创建副本以避免SettingWithCopyWarning
-                sub_group.loc[:, 'timeconsume'] = sub_group['timeconsume'].replace(['--', '-'], np.nan).infer_objects(copy=False)
-                sub_group.loc[:, 'timeconsume'] = pd.to_numeric(sub_group['timeconsume'], errors='coerce')
-                sub_avg_time_consume = sub_group['timeconsume'].mean()
-                
-                sub_knowledge_mastery[sub_knowledge] = {
-                    'correct_rate': float(sub_correct_rate),
-                    'mastery_level': float(sub_correct_rate),  # 掌握程度，与correct_rate相同但语义更明确
-                    'correct_submission_rate': float(sub_correct_submission_rate),
-                    'avg_time_consume': float(sub_avg_time_consume),
-                    'total_submissions': int(sub_total_submissions),
-                    'correct_submissions': int(sub_correct_submissions)
-                }
-            
-            knowledge_mastery[knowledge]['sub_knowledge'] = sub_knowledge_mastery
+        for knowledge, stats in knowledge_stats.iterrows():
+            knowledge_mastery[knowledge] = self._knowledge_stats_record(stats)
+            knowledge_mastery[knowledge]['sub_knowledge'] = {}
+        for (knowledge, sub_knowledge), stats in sub_knowledge_stats.iterrows():
+            knowledge_mastery[knowledge]['sub_knowledge'][sub_knowledge] = self._knowledge_stats_record(stats)
         
         # 识别薄弱环节
         weak_points = []
@@ -141,22 +192,20 @@ class AnalysisService:
                         'reason': '从属知识点正确率较低'
                     })
         
-        # 计算全体学生的平均掌握程度和平均正确提交率
-        overall_averages = {}
-        if not student_id:  # 如果分析的是所有学生，计算平均值
-            for knowledge, data in knowledge_mastery.items():
-                overall_averages[knowledge] = {
+        # 全体学生的平均掌握程度和平均正确提交率
+        if population:  # 如果分析的是所有学生，直接使用本次的统计结果
+            overall_averages = {
+                knowledge: {
                     'avg_mastery_level': data['mastery_level'],
                     'avg_correct_submission_rate': data['correct_submission_rate']
                 }
-        else:  # 如果分析的是单个学生，需要获取全体学生的平均值
-            all_result = self.analyze_knowledge_mastery(None)
-            if all_result['status'] == 'success':
-                for knowledge, data in all_result['knowledge_mastery'].items():
-                    overall_averages[knowledge] = {
-                        'avg_mastery_level': data['mastery_level'],
-                        'avg_correct_submission_rate': data['correct_submission_rate']
-                    }
+                for knowledge, data in knowledge_mastery.items()
+            }
+        else:  # 如果分析的是单个学生或班级，使用缓存的全体学生基准值
+            overall_averages = {
+                knowledge: dict(averages)
+                for knowledge, averages in self.get_population_baseline()['knowledge'].items()
+            }
         
         return {
             'status': 'success',
@@ -166,339 +215,512 @@ class AnalysisService:
             'weak_points': weak_points
         }
     
-    def analyze_knowledge_scatter_data(self):
-        """分析知识点掌握程度与正确率关系数据，用于散点图展示
+    @staticmethod
+    def _aggregate_knowledge_stats(cube, keys):
+        """由聚合立方体上卷得到知识点掌握情况统计
+        
+        Args:
+            cube: 聚合立方体（可为单个学生的子立方体）
+            keys: 上卷维度，如['knowledge']或['knowledge', 'sub_knowledge']
+            
+        Returns:
+            以维度为索引的统计DataFrame，包含correct_rate、correct_submission_rate、
+            avg_time_consume、total_submissions和correct_submissions列
+        """
+        rollup = cube.rollup(keys)
+        # 掌握程度为Mastery的平均值（提交记录缺少Mastery时数据服务已现场计算），没有有效值时为0
+        return pd.DataFrame({
+            'correct_rate': AggregateCube.mean(rollup, 'mastery').fillna(0),
+            'correct_submission_rate': rollup['correct'] / rollup['count'],
+            'avg_time_consume': AggregateCube.mean(rollup, 'timeconsume'),
+            'total_submissions': rollup['count'],
+            'correct_submissions': rollup['correct']
+        })
+    
+    @staticmethod
+    def _knowledge_stats_record(stats):
+        """将一行聚合统计转换为知识点掌握情况字典"""
+        return {
+            'correct_rate': float(stats['correct_rate']),
+            'mastery_level': float(stats['correct_rate']),  # 掌握程度，与correct_rate相同但语义更明确
+            'correct_submission_rate': float(stats['correct_submission_rate']),
+            'avg_time_consume': float(stats['avg_time_consume']),
+            'total_submissions': int(stats['total_submissions']),
+            'correct_submissions': int(stats['correct_submissions'])
+        }
+    
+    @staticmethod
+    def _scatter_levels(cube):
+        """由聚合立方体一次上卷计算知识点、子知识点和题目三个层级的散点图统计
+        
+        先按 知识点×子知识点×题目×primary 上卷得到一张小表，各层级再由这张表分组：
+        知识点和子知识点层级统计全部关联记录，题目数量为不同题目数；
+        题目层级只统计primary记录（按提交计数），知识点取该题的primary关联记录。
         
         Returns:
-            知识点散点图数据
+            层级名('knowledge'、'sub_knowledge'、'title_ID') -> 统计DataFrame（按取值排序）
+        """
+        base = cube.rollup(['knowledge', 'sub_knowledge', 'title_ID', 'primary']).reset_index()
+        base = base.astype({dimension: object for dimension in ['knowledge', 'sub_knowledge', 'title_ID']})
+        
+        levels = {}
+        for dimension in ('knowledge', 'sub_knowledge'):
+            rollup = base.groupby(dimension, sort=True)[CUBE_MEASURES].sum()
+            question_count = base.drop_duplicates([dimension, 'title_ID']).groupby(dimension).size()
+            levels[dimension] = pd.DataFrame({
+                'avg_mastery': AggregateCube.mean(rollup, 'mastery').fillna(0),
+                'correct_rate': rollup['correct'] / rollup['count'],
+                'question_count': question_count.reindex(rollup.index).fillna(0),
+                'total_submissions': rollup['count']
+            })
+        
+        primary = base[base['primary']]
+        rollup = primary.groupby('title_ID', sort=True)[CUBE_MEASURES].sum()
+        info = primary.drop_duplicates('title_ID').set_index('title_ID').reindex(rollup.index)
+        levels['title_ID'] = pd.DataFrame({
+            'knowledge': info['knowledge'],
+            'sub_knowledge': info['sub_knowledge'],
+            'avg_mastery': AggregateCube.mean(rollup, 'mastery').fillna(0),
+            'correct_rate': rollup['correct'] / rollup['count'],
+            'total_submissions': rollup['count']
+        })
+        return levels
+    
+    @cached_result
+    def analyze_scatter_data(self):
+        """分析知识点、子知识点和题目三个层级的掌握程度与正确率关系数据，用于散点图展示
+        
+        三个层级由聚合立方体的同一次上卷得到。
+        
+        Returns:
+            包含knowledge_scatter_data、sub_knowledge_scatter_data和question_scatter_data的字典
         """
         try:
-            # 获取所有提交记录
-            all_submissions = pd.DataFrame(self.data_service.get_all_submissions())
-            if all_submissions.empty:
+            # 获取预聚合立方体
+            cube = self.data_service.get_aggregate_cube()
+            if cube.empty:
                 return {'status': 'error', 'message': '没有找到提交记录数据'}
             
             # 获取题目信息
-            questions = pd.DataFrame(self.data_service.get_questions())
+            questions = self.data_service.get_questions_df()
             if questions.empty:
                 return {'status': 'error', 'message': '没有找到题目数据'}
             
-            # 合并提交记录和题目信息
-            merged_data = pd.merge(all_submissions, questions, on='title_ID', how='left')
+            levels = self._scatter_levels(cube)
+            scatter_data = {}
+            for dimension, key in (('knowledge', 'knowledge_scatter_data'),
+                                   ('sub_knowledge', 'sub_knowledge_scatter_data')):
+                scatter_data[key] = [{
+                    dimension: value,
+                    'avg_mastery': float(stats['avg_mastery']),
+                    'correct_rate': float(stats['correct_rate']),
+                    'question_count': int(stats['question_count']),
+                    'total_submissions': int(stats['total_submissions'])
+                } for value, stats in levels[dimension].iterrows()]
             
-            # 处理缺失值
-            merged_data.fillna({'knowledge': '未知'}, inplace=True)
-            
-            knowledge_scatter_data = []
+            scatter_data['question_scatter_data'] = [{
+                'title_id': title_id,
+                'knowledge': stats['knowledge'],
+                'sub_knowledge': stats['sub_knowledge'],
+                'avg_mastery': float(stats['avg_mastery']),
+                'correct_rate': float(stats['correct_rate']),
+                'total_submissions': int(stats['total_submissions'])
+            } for title_id, stats in levels['title_ID'].iterrows()]
             
-            # 按知识点分组分析
-            for knowledge, group in merged_data.groupby('knowledge'):
-                # 计算平均掌握程度
-                if 'Mastery' in group.columns:
-                    mastery_values = pd.to_numeric(group['Mastery'], errors='coerce')
-                    avg_mastery = mastery_values.mean() if not mastery_values.isna().all() else 0
-                else:
-                    avg_mastery = 0
-                
-                # 计算正确率
-                total_submissions = len(group)
-                correct_submissions = len(group[group['state'] == 'Absolutely_Correct'])
-                correct_rate = correct_submissions / total_submissions if total_submissions > 0 else 0
-                
-                # 计算该知识点的题目数量
-                question_count = len(group['title_ID'].unique())
-                
-                knowledge_scatter_data.append({
-                    'knowledge': knowledge,
-                    'avg_mastery': float(avg_mastery),
-                    'correct_rate': float(correct_rate),
-                    'question_count': int(question_count),
-                    'total_submissions': int(total_submissions)
-                })
-            
-            return {
-                'status': 'success',
-                'knowledge_scatter_data': knowledge_scatter_data
-            }
+            return {'status': 'success', **scatter_data}
             
         except Exception as e:
             return {
                 'status': 'error',
-                'message': f'分析知识点散点图数据时出错: {str(e)}'
+                'message': f'分析散点图数据时出错: {str(e)}'
             }
     
+    def analyze_knowledge_scatter_data(self):
+        """分析知识点掌握程度与正确率关系数据，用于散点图展示
+        
+        Returns:
+            知识点散点图数据
+        """
+        result = self.analyze_scatter_data()
+        if result['status'] != 'success':
+            return result
+        return {
+            'status': 'success',
+            'knowledge_scatter_data': result['knowledge_scatter_data']
+        }
+    
     def analyze_sub_knowledge_scatter_data(self):
         """分析子知识点掌握程度与正确率关系数据，用于散点图展示
         
         Returns:
             子知识点散点图数据
         """
-        try:
-            # 获取所有提交记录
-            all_submissions = pd.DataFrame(self.data_service.get_all_submissions())
-            if all_submissions.empty:
-                return {'status': 'error', 'message': '没有找到提交记录数据'}
-            
-            # 获取题目信息
-            questions = pd.DataFrame(self.data_service.get_questions())
-            if questions.empty:
-                return {'status': 'error', 'message': '没有找到题目数据'}
-            
-            # 合并提交记录和题目信息
-            merged_data = pd.merge(all_submissions, questions, on='title_ID', how='left')
-            
-            # 处理缺失值
-            merged_data.fillna({'sub_knowledge': '未知'}, inplace=True)
-            
-            sub_knowledge_scatter_data = []
-            
-            # 按子知识点分组分析
-            for sub_knowledge, group in merged_data.groupby('sub_knowledge'):
-                # 计算平均掌握程度
-                if 'Mastery' in group.columns:
-                    mastery_values = pd.to_numeric(group['Mastery'], errors='coerce')
-                    avg_mastery = mastery_values.mean() if not mastery_values.isna().all() else 0
-                else:
-                    avg_mastery = 0
-                
-                # 计算正确率
-                total_submissions = len(group)
-                correct_submissions = len(group[group['state'] == 'Absolutely_Correct'])
-                correct_rate = correct_submissions / total_submissions if total_submissions > 0 else 0
-                
-                # 计算该子知识点的题目数量
-                question_count = len(group['title_ID'].unique())
-                
-                sub_knowledge_scatter_data.append({
-                    'sub_knowledge': sub_knowledge,
-                    'avg_mastery': float(avg_mastery),
-                    'correct_rate': float(correct_rate),
-                    'question_count': int(question_count),
-                    'total_submissions': int(total_submissions)
-                })
-            
-            return {
-                'status': 'success',
-                'sub_knowledge_scatter_data': sub_knowledge_scatter_data
-            }
-            
-        except Exception as e:
-            return {
-                'status': 'error',
-                'message': f'分析子知识点散点图数据时出错: {str(e)}'
-            }
+        result = self.analyze_scatter_data()
+        if result['status'] != 'success':
+            return result
+        return {
+            'status': 'success',
+            'sub_knowledge_scatter_data': result['sub_knowledge_scatter_data']
+        }
 
-    def analyze_knowledge_mastery_timeseries(self, student_id=None):
+    def analyze_knowledge_mastery_timeseries(self, student_id=None, format='records', bucket=None, max_points=None):
         """分析知识点掌握程度的时序变化
         
         Args:
             student_id: 学生ID，如果为None则分析所有学生的平均情况
+            format: 'records'时每条时间线为点字典列表；'columnar'时为timestamp、mastery_level、
+                    state（state_labels中的编码）和score等并列数组
+            bucket: 可选'hour'、'day'、'week'，按北京时间分桶后输出每桶的平均掌握度、平均得分和提交数
+            max_points: 每条时间线的最大点数，超过时使用LTTB算法降采样
             
         Returns:
             知识点掌握度时序分析结果
         """
+        if format not in TIMESERIES_FORMATS:
+            return {'status': 'error', 'message': f'不支持的输出格式: {format}'}
+        return self._analyze_timeseries(student_id, format, bucket, max_points)
+    
+    def analyze_knowledge_mastery_timeseries_frame(self, student_id=None, bucket=None, max_points=None):
+        """知识点掌握度时序数据的扁平表形式，供Arrow等按列格式直接输出
+        
+        每行为一条时间线上的一个点：knowledge、sub_knowledge（知识点时间线为空）为分类列，
+        其余列与columnar格式的并列数组相同，state列为分类列（分桶时为count列）。
+        
+        Args:
+            student_id、bucket、max_points: 同analyze_knowledge_mastery_timeseries
+            
+        Returns:
+            包含frame（DataFrame）的结果字典
+        """
+        result = self._analyze_timeseries(student_id, 'arrays', bucket, max_points)
+        if result['status'] == 'error':
+            return result
+        
+        # 各时间线依次排列：每个知识点先是知识点时间线，再是其子知识点时间线
+        segments = []
+        knowledge_names = list(result['timeseries_data'])
+        sub_names = {}
+        for knowledge_code, (knowledge, data) in enumerate(result['timeseries_data'].items()):
+            segments.append((knowledge_code, -1, data['timeline']))
+            for sub_knowledge, sub_data in data['sub_knowledge'].items():
+                sub_code = sub_names.setdefault(sub_knowledge, len(sub_names))
+                segments.append((knowledge_code, sub_code, sub_data['timeline']))
+        lengths = [len(points['timestamp']) for _, _, points in segments]
+        
+        def column(name, dtype):
+            return np.concatenate([points[name] for _, _, points in segments] or [np.empty(0, dtype=dtype)])
+        
+        frame = pd.DataFrame({
+            'knowledge': pd.Categorical.from_codes(
+                np.repeat([segment[0] for segment in segments], lengths).astype(np.int32), knowledge_names),
+            'sub_knowledge': pd.Categorical.from_codes(
+                np.repeat([segment[1] for segment in segments], lengths).astype(np.int32), list(sub_names)),
+            'timestamp': column('timestamp', np.int64),
+            'mastery_level': column('mastery_level', np.float64)
+        })
+        if bucket is None:
+            frame['state'] = pd.Categorical.from_codes(column('state', np.int8), result['state_labels'])
+        frame['score'] = column('score', np.float64)
+        if bucket is not None:
+            frame['count'] = column('count', np.int64)
+        
+        return {
+            'status': 'success',
+            'student_id': student_id,
+            'frame': frame
+        }
+    
+    def _analyze_timeseries(self, student_id, format, bucket, max_points):
+        """检查参数并读取事实行，返回时序分析结果（format已检查，可为内部的'arrays'格式）"""
+        if bucket is not None and bucket not in TIMESERIES_BUCKETS:
+            return {'status': 'error', 'message': f'不支持的时间分桶: {bucket}'}
+        if max_points is not None and max_points < 3:
+            return {'status': 'error', 'message': 'max_points至少为3'}
+        
         # 获取所有提交记录
-        all_submissions = pd.DataFrame(self.data_service.get_all_submissions())
+        all_submissions = self.data_service.get_all_submissions_df()
         if all_submissions.empty:
             return {'status': 'error', 'message': '没有找到提交记录数据'}
         
         # 获取题目信息
-        questions = pd.DataFrame(self.data_service.get_questions())
+        questions = self.data_service.get_questions_df()
         if questions.empty:
             return {'status': 'error', 'message': '没有找到题目数据'}
         
-        # 如果指定了学生ID，则只分析该学生的数据
-        if student_id:
-            submissions = all_submissions[all_submissions['student_ID'] == student_id]
-            if submissions.empty:
-                return {'status': 'error', 'message': f'没有找到学生 {student_id} 的提交记录'}
-        else:
-            submissions = all_submissions
+        # 获取已关联题目信息的事实表，如果指定了学生ID，则只分析该学生的数据
+        merged_data = self.data_service.get_fact_table(student_id)
+        if student_id and merged_data.empty:
+            return {'status': 'error', 'message': f'没有找到学生 {student_id} 的提交记录'}
         
-        # 合并提交记录和题目信息
-        merged_data = pd.merge(submissions, questions, on='title_ID', how='left')
+        return self._timeseries_result(student_id, merged_data, format, bucket, max_points)
+    
+    def _timeseries_result(self, student_id, merged_data, format, bucket, max_points):
+        """由事实行组装知识点掌握度时序分析结果
         
-        # 处理缺失值和无效值
-        merged_data = merged_data.copy()
-        # 过滤掉无效的知识点和子知识点
-        merged_data = merged_data[merged_data['knowledge'].notna() & (merged_data['knowledge'] != '')]
-        merged_data.loc[merged_data['sub_knowledge'].isna() | (merged_data['sub_knowledge'] == ''), 'sub_knowledge'] = '未分类'
+        Args:
+            student_id: 学生ID，为None时表示全体学生
+            merged_data: 事实表（或其中一个学生的事实行）
+            format、bucket、max_points: 同analyze_knowledge_mastery_timeseries
+        """
+        # 只保留时序用到的列，后续过滤和排序不复制事实表的其他列
+        merged_data = merged_data[['time', 'datetime', 'Mastery', 'state', 'score', 'knowledge', 'sub_knowledge']]
+        
+        # 过滤掉无效的知识点（事实表中缺失的知识点已填充为'未知'），缺失的子知识点归为'未分类'
+        merged_data = merged_data[merged_data['knowledge'] != '未知']
+        sub_knowledge = merged_data['sub_knowledge'].astype(object)
+        merged_data = merged_data.assign(sub_knowledge=sub_knowledge.mask(sub_knowledge.isin(['未知', '']), '未分类'))
+        
+        # 按时间排序（事实表已包含北京时间datetime列）
+        merged_data = merged_data.sort_values('datetime', kind='stable')
+        
+        # 时序字段转换为并列数组，直接使用CSV中的Mastery字段作为掌握度
+        columns = {
+            'timestamp': merged_data['time'].to_numpy(np.int64),
+            'mastery_level': merged_data['Mastery'].fillna(0.0).to_numpy(np.float64),
+            'state': merged_data['state'].cat.codes.to_numpy(),
+            'score': merged_data['score'].fillna(0).to_numpy(np.float64)
+        }
+        state_labels = merged_data['state'].cat.categories
         
-        # 转换时间戳为datetime对象（转换为北京时间 UTC+8）
-        merged_data.loc[:, 'datetime'] = pd.to_datetime(merged_data['time'], unit='s', utc=True)
-        # 转换为北京时间
-        merged_data.loc[:, 'datetime'] = merged_data['datetime'].dt.tz_convert('Asia/Shanghai')
+        def build_timeline(rows):
+            return self._build_timeline({name: values[rows] for name, values in columns.items()},
+                                        state_labels, format, bucket, max_points)
         
-        # 按时间排序
-        merged_data = merged_data.sort_values('datetime')
+        # 按知识点（分类编码顺序）和子知识点（名称排序）划分连续的行区间，区间内保持时间顺序
+        knowledge_codes = merged_data['knowledge'].cat.codes.to_numpy()
+        knowledge_names = merged_data['knowledge'].cat.categories
+        sub_codes, sub_names = pd.factorize(merged_data['sub_knowledge'], sort=True)
+        knowledge_order = np.argsort(knowledge_codes, kind='stable')
+        sub_order = np.lexsort((sub_codes, knowledge_codes))
         
         # 计算时序掌握度数据
         timeseries_data = {}
-        
-        # 按知识点分组
-        for knowledge, knowledge_group in merged_data.groupby('knowledge'):
+        for knowledge_code, knowledge_rows in self._split_segments(knowledge_codes, knowledge_order):
+            knowledge = knowledge_names[knowledge_code]
             # 跳过无效的知识点
-            if not knowledge or knowledge == 'undefined' or knowledge == '未知':
+            if knowledge_code < 0 or not knowledge or knowledge == 'undefined' or knowledge == '未知':
                 continue
-                
-            knowledge_timeline = []
-            sub_knowledge_data = {}
-            
-            # 直接使用CSV中的Mastery字段作为掌握度
-            for idx, row in knowledge_group.iterrows():
-                # 使用CSV中的Mastery字段
-                mastery_level = float(row['Mastery']) if not pd.isnull(row['Mastery']) else 0.0
-                
-                knowledge_timeline.append({
-                    'timestamp': int(row['time']),
-                    'mastery_level': float(mastery_level),  # 直接使用Mastery字段
-                    'state': row['state'],
-                    'score': float(row['score_x']) if not pd.isnull(row['score_x']) else 0
-                })
-            
-            # 计算子知识点的时序掌握度
-            for sub_knowledge, sub_group in knowledge_group.groupby('sub_knowledge'):
-                # 跳过无效的子知识点
-                if not sub_knowledge or sub_knowledge == 'undefined' or sub_knowledge == '未知':
-                    continue
-                    
-                sub_timeline = []
-                sub_cumulative_correct = 0
-                sub_cumulative_total = 0
-                
-                for idx, row in sub_group.iterrows():
-                    # 直接使用CSV中的Mastery字段
-                    sub_mastery_level = float(row['Mastery']) if not pd.isnull(row['Mastery']) else 0.0
-                    
-                    sub_timeline.append({
-                        'timestamp': int(row['time']),
-                        'mastery_level': float(sub_mastery_level),  # 直接使用Mastery字段
-                        'state': row['state'],
-                        'score': float(row['score_x']) if not pd.isnull(row['score_x']) else 0
-                    })
-                
-                # 只有当时间线有数据时才添加
-                if sub_timeline:
-                    sub_knowledge_data[sub_knowledge] = {
-                        'timeline': sub_timeline
-                    }
-            
-            # 只有当时间线有数据时才添加
-            if knowledge_timeline:
-                timeseries_data[knowledge] = {
-                    'timeline': knowledge_timeline,
-                    'sub_knowledge': sub_knowledge_data
-                }
+            timeseries_data[knowledge] = {
+                'timeline': build_timeline(knowledge_rows),
+                'sub_knowledge': {}
+            }
         
-        return {
+        # 计算子知识点的时序掌握度
+        pair_codes = knowledge_codes.astype(np.int64) * (len(sub_names) + 1) + sub_codes
+        for _, sub_rows in self._split_segments(pair_codes, sub_order):
+            knowledge = knowledge_names[knowledge_codes[sub_rows[0]]]
+            sub_code = sub_codes[sub_rows[0]]
+            # 跳过无效的子知识点
+            if knowledge not in timeseries_data or sub_code < 0:
+                continue
+            sub_knowledge = sub_names[sub_code]
+            if not sub_knowledge or sub_knowledge == 'undefined' or sub_knowledge == '未知':
+                continue
+            timeseries_data[knowledge]['sub_knowledge'][sub_knowledge] = {
+                'timeline': build_timeline(sub_rows)
+            }
+        
+        result = {
             'status': 'success',
             'student_id': student_id,
             'timeseries_data': timeseries_data
         }
+        if format == 'columnar':
+            result['format'] = format
+        if format != 'records':
+            result['state_labels'] = state_labels.tolist()
+        if bucket is not None:
+            result['bucket'] = bucket
+        if max_points is not None:
+            result['max_points'] = max_points
+        return result
     
-    def analyze_learning_behavior(self, student_id=None):
+    @staticmethod
+    def _split_segments(keys, order):
+        """按排序后的键划分连续区间
+        
+        Args:
+            keys: 每行的分组键
+            order: 使相同键连续排列的稳定排序行号
+            
+        Returns:
+            (键, 该键对应的行号数组)列表
+        """
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(order) else []
+        stops = list(starts[1:]) + [len(order)]
+        return [(sorted_keys[start], order[start:stop]) for start, stop in zip(starts, stops)]
+    
+    @staticmethod
+    def _build_timeline(points, state_labels, format, bucket, max_points):
+        """将按时间排序的点数组转换为时间线（可选分桶和降采样）
+        
+        Args:
+            points: timestamp、mastery_level、state（编码）、score并列数组
+            state_labels: 状态编码对应的状态名称
+            format: 'records'、'columnar'或'arrays'（内部使用，直接返回numpy数组）
+            bucket: 时间分桶粒度，None表示不分桶
+            max_points: 最大点数，None表示不降采样
+        """
+        if bucket is not None:
+            # 按北京时间对齐分桶，时间戳取桶起点；周从周一开始（1970-01-01为周四）
+            size = TIMESERIES_BUCKETS[bucket]
+            shift = BEIJING_UTC_OFFSET + (3 * 86400 if bucket == 'week' else 0)
+            bucket_starts = (points['timestamp'] + shift) // size * size - shift
+            keys, starts, counts = np.unique(bucket_starts, return_index=True, return_counts=True)
+            points = {
+                'timestamp': keys,
+                'mastery_level': np.add.reduceat(points['mastery_level'], starts) / counts,
+                'score': np.add.reduceat(points['score'], starts) / counts,
+                'count': counts
+            }
+        
+        if max_points is not None and len(points['timestamp']) > max_points:
+            selected = lttb_indices(points['timestamp'], points['mastery_level'], max_points)
+            points = {name: values[selected] for name, values in points.items()}
+        
+        if format == 'arrays':
+            return points
+        if format == 'columnar':
+            return {name: values.tolist() for name, values in points.items()}
+        
+        if 'state' in points:
+            points = dict(points, state=np.asarray(state_labels, dtype=object).take(points['state']))
+        names = list(points)
+        return [dict(zip(names, values)) for values in zip(*(points[name].tolist() for name in names))]
+    
+    @cached_result
+    def analyze_learning_behavior(self, student_id=None, class_id=None):
         """分析学习行为模式
         
         Args:
             student_id: 学生ID，如果为None则分析所有学生
+            class_id: 班级ID，未指定学生时只分析该班级（按提交记录的class列）
             
         Returns:
             学习行为模式分析结果
         """
-        # 获取所有提交记录
-        all_submissions = pd.DataFrame(self.data_service.get_all_submissions())
-        if all_submissions.empty:
+        # 获取预聚合立方体和按学生预计算的行为直方图
+        cube = self.data_service.get_aggregate_cube()
+        histograms = self.data_service.get_behavior_histograms()
+        if cube.empty or histograms.empty:
             return {'status': 'error', 'message': '没有找到提交记录数据'}
         
         # 如果指定了学生ID，则只分析该学生的数据
         if student_id:
-            submissions = all_submissions[all_submissions['student_ID'] == student_id]
-            if submissions.empty:
+            cube = cube.for_student(student_id)
+            if cube.empty or student_id not in histograms:
                 return {'status': 'error', 'message': f'没有找到学生 {student_id} 的提交记录'}
             
             # 获取学生信息
-            students = pd.DataFrame(self.data_service.get_students({'student_ID': student_id}))
+            students = self.data_service.get_students_df({'student_ID': student_id})
             if students.empty:
                 student_info = {'student_ID': student_id}
             else:
                 student_info = students.iloc[0].to_dict()
+            distributions = self._histogram_distributions(histograms, student_id)
+        elif class_id:
+            cube = cube.for_class(class_id)
+            if cube.empty:
+                return {'status': 'error', 'message': f'没有找到班级 {class_id} 的提交记录'}
+            student_info = None
+            distributions = self._class_distributions(cube, class_id)
         else:
-            submissions = all_submissions
             student_info = None
+            distributions = self._histogram_distributions(histograms, None)
+        
+        # 按提交计数的统计量由立方体上卷得到
+        result = self._behavior_result(student_id or None, student_info, cube.totals(primary_only=True), distributions)
+        if class_id and not student_id:
+            result['class_id'] = class_id
+        return result
+    
+    @staticmethod
+    def _histogram_distributions(histograms, student_id):
+        """提交次数分布为直方图的一行（单个学生）或各列之和（全体学生）"""
+        return {name: histograms.distribution(name, student_id) for name in HISTOGRAMS}
+    
+    def _class_distributions(self, cube, class_id):
+        """班级的提交次数分布：时段和星期由班级子立方体上卷，状态和方法由class列索引取出班级提交后分组"""
+        hours = cube.rollup(['hour'], primary_only=True)['count']
+        days = cube.rollup(['day'], primary_only=True)['count']
+        # 北京时间自1970-01-01（星期四）起的天数换算为星期，0为星期一
+        weekdays = days.groupby((days.index.to_numpy() + 3) % 7).sum()
+        submissions = self.data_service.get_class_submissions(class_id, ['state', 'method'])
         
-        # 转换时间戳为datetime对象（转换为北京时间 UTC+8）
-        submissions = submissions.copy()  # 创建副本以避免SettingWithCopyWarning
-        submissions.loc[:, 'datetime'] = pd.to_datetime(submissions['time'], unit='s', utc=True)
-        # 转换为北京时间（UTC+8）
-        submissions.loc[:, 'datetime'] = submissions['datetime'].dt.tz_convert('Asia/Shanghai')
+        def code_counts(column):
+            # 按分类编码计数，与行为直方图一样以全部取值为索引（未出现的取值为0）
+            values = submissions[column]
+            codes = values.cat.codes.to_numpy()
+            categories = values.cat.categories
+            return pd.Series(np.bincount(codes[codes >= 0], minlength=len(categories)),
+                             index=pd.Index(np.asarray(categories, dtype=object)))
         
-        # 提取时间特征
-        submissions.loc[:, 'hour'] = submissions['datetime'].dt.hour
-        submissions.loc[:, 'day'] = submissions['datetime'].dt.day
-        submissions.loc[:, 'weekday'] = submissions['datetime'].dt.weekday
+        return {
+            'hour': hours.reindex(range(24), fill_value=0),
+            'weekday': weekdays.reindex(range(7), fill_value=0),
+            'state': code_counts('state'),
+            'method': code_counts('method')
+        }
+    
+    def _behavior_result(self, student_id, student_info, totals, distributions):
+        """由按提交计数的度量汇总和提交次数分布组装学习行为分析结果
         
-        # 分析答题高峰时段 - 生成完整的24小时分布
-        hour_counts = submissions.groupby('hour').size().reset_index(name='count')
+        Args:
+            student_id: 学生ID，为None时表示全体学生或班级
+            student_info: 学生信息字典（未指定学生时为None）
+            totals: 按提交计数的度量汇总Series
+            distributions: hour、weekday、state、method -> 以取值为索引的提交次数Series
+        """
+        hour_totals = distributions['hour']
+        weekday_totals = distributions['weekday']
+        state_totals = distributions['state']
+        method_totals = distributions['method']
         
-        # 确保包含所有24小时，没有提交的小时显示为0
-        all_hours = pd.DataFrame({'hour': range(24)})
-        hour_counts = all_hours.merge(hour_counts, on='hour', how='left').fillna(0)
-        hour_counts['count'] = hour_counts['count'].astype(int)
+        # 分析答题高峰时段 - 完整的24小时分布（北京时间小时），没有提交的小时显示为0
+        hour_counts = pd.DataFrame({'hour': range(24), 'count': hour_totals.to_numpy().astype(int)})
         
         # 获取前3个高峰时段（用于兼容性）
         peak_hours = hour_counts.sort_values('count', ascending=False).head(3)
         
-        # 分析答题状态分布
-        state_counts = submissions.groupby('state').size().reset_index(name='count')
-        state_distribution = {row['state']: row['count'] for _, row in state_counts.iterrows()}
+        # 星期分布（北京时间，0为星期一）
+        weekday_distribution = [{'weekday': int(weekday), 'count': int(count)}
+                                for weekday, count in weekday_totals.items()]
         
-        # 计算掌握程度（基于Mastery字段）
-        if 'Mastery' in submissions.columns:
-            # 使用Mastery字段计算平均掌握程度
-            mastery_rate = submissions['Mastery'].mean()
-        else:
-            # 如果没有Mastery字段，回退到正确率计算
-            correct_submissions = submissions[submissions['state'] == 'Absolutely_Correct']
-            mastery_rate = len(correct_submissions) / len(submissions) if len(submissions) > 0 else 0
+        # 分析答题状态分布（只包含出现过的状态）
+        state_distribution = {state: int(count) for state, count in state_totals.items() if count > 0}
+        
+        # 计算掌握程度（基于Mastery字段的平均值）
+        mastery_rate = AggregateCube.mean(totals, 'mastery')
         
         # 分析平均答题时间
-        # 处理异常值，如"--"或"-"等非数值
-        submissions.loc[:, 'timeconsume'] = submissions['timeconsume'].replace(['--', '-'], np.nan).infer_objects(copy=False)
-        submissions.loc[:, 'timeconsume'] = pd.to_numeric(submissions['timeconsume'], errors='coerce')
-        avg_time_consume = submissions['timeconsume'].mean()
+        avg_time_consume = AggregateCube.mean(totals, 'timeconsume')
         
-        # 分析内存使用情况
-        avg_memory = submissions[submissions['memory'] > 0]['memory'].mean()
+        # 分析内存使用情况（只统计正值）
+        avg_memory = AggregateCube.mean(totals, 'memory')
         
-        # 分析使用的方法分布
-        method_counts = submissions.groupby('method').size().reset_index(name='count')
-        method_distribution = {row['method']: row['count'] for _, row in method_counts.iterrows()}
+        # 分析使用的方法分布（只包含出现过的方法）
+        method_distribution = {method: int(count) for method, count in method_totals.items() if count > 0}
         
         # 构建学习行为画像
         behavior_profile = {
             'peak_hours': peak_hours.to_dict('records'),
             'hour_distribution': hour_counts.to_dict('records'),  # 完整的24小时分布
+            'weekday_distribution': weekday_distribution,
             'state_distribution': state_distribution,
             'correct_rate': mastery_rate,  # 使用掌握程度替代正确率
             'avg_time_consume': avg_time_consume,
             'avg_memory': avg_memory,
             'method_distribution': method_distribution,
-            'total_submissions': len(submissions)
+            'total_submissions': int(hour_totals.sum())
         }
         
         # 如果是分析单个学生，添加个性化分析
         if student_id:
-            # 获取所有学生的掌握程度数据进行对比
-            if 'Mastery' in all_submissions.columns:
-                all_students_mastery_rate = all_submissions['Mastery'].mean()
-            else:
-                all_students_mastery_rate = len(all_submissions[all_submissions['state'] == 'Absolutely_Correct']) / len(all_submissions)
-            
-            # 处理所有学生的timeconsume数据中的异常值
-            all_submissions_copy = all_submissions.copy()
-            all_submissions_copy.loc[:, 'timeconsume'] = all_submissions_copy['timeconsume'].replace(['--', '-'], np.nan).infer_objects(copy=False)
-            all_submissions_copy.loc[:, 'timeconsume'] = pd.to_numeric(all_submissions_copy['timeconsume'], errors='coerce')
-            all_students_avg_time = all_submissions_copy['timeconsume'].mean()
+            # 使用缓存的全体学生基准值进行对比
+            baseline = self.get_population_baseline()
+            all_students_mastery_rate = baseline['mastery_rate']
+            all_students_avg_time = baseline['avg_time_consume']
             
             # 计算相对表现
             behavior_profile['relative_performance'] = {
@@ -515,122 +737,408 @@ class AnalysisService:
             'student_info': student_info
         }
     
-    def analyze_question_difficulty(self):
+    def analyze_batch(self, student_ids, analysis_types=BATCH_ANALYSIS_TYPES, format='records', bucket=None,
+                      max_points=None):
+        """批量分析多个学生
+        
+        所有学生一起处理：知识点和行为统计由包含这些学生的子立方体按学生上卷一次得到，
+        行为分布直接读取直方图的行，时序数据的事实行只取一次。每个学生的结果与单独调用
+        对应分析方法的结果一致。
+        
+        Args:
+            student_ids: 学生ID列表
+            analysis_types: 分析类型列表，可选'knowledge'、'behavior'、'timeseries'
+            format、bucket、max_points: 时序分析的参数，同analyze_knowledge_mastery_timeseries
+            
+        Returns:
+            包含results（学生ID -> 分析类型 -> 分析结果）的字典
+        """
+        if not student_ids:
+            return {'status': 'error', 'message': '学生ID列表不能为空'}
+        if not analysis_types:
+            return {'status': 'error', 'message': '分析类型列表不能为空'}
+        unsupported = [analysis_type for analysis_type in analysis_types if analysis_type not in BATCH_ANALYSIS_TYPES]
+        if unsupported:
+            return {'status': 'error', 'message': f'不支持的分析类型: {", ".join(map(str, unsupported))}'}
+        if format not in TIMESERIES_FORMATS:
+            return {'status': 'error', 'message': f'不支持的输出格式: {format}'}
+        if bucket is not None and bucket not in TIMESERIES_BUCKETS:
+            return {'status': 'error', 'message': f'不支持的时间分桶: {bucket}'}
+        if max_points is not None and max_points < 3:
+            return {'status': 'error', 'message': 'max_points至少为3'}
+        
+        # 去重并保持请求顺序
+        student_ids = list(dict.fromkeys(student_ids))
+        
+        cube = self.data_service.get_aggregate_cube()
+        if cube.empty:
+            return {'status': 'error', 'message': '没有找到提交记录数据'}
+        questions = self.data_service.get_questions_df()
+        if questions.empty:
+            return {'status': 'error', 'message': '没有找到题目数据'}
+        
+        results = {student_id: {} for student_id in student_ids}
+        student_cube = cube.for_students(student_ids)
+        
+        def split_by_student(stats):
+            """按学生拆分以(学生ID, ...)为索引的上卷结果"""
+            return {student_id: group.droplevel('student_ID')
+                    for student_id, group in stats.groupby(level='student_ID', observed=True, sort=False)}
+        
+        if 'knowledge' in analysis_types:
+            knowledge_stats = split_by_student(
+                self._aggregate_knowledge_stats(student_cube, ['student_ID', 'knowledge']))
+            sub_knowledge_stats = split_by_student(
+                self._aggregate_knowledge_stats(student_cube, ['student_ID', 'knowledge', 'sub_knowledge']))
+            for student_id in student_ids:
+                if student_id in knowledge_stats:
+                    results[student_id]['knowledge'] = self._knowledge_result(
+                        student_id, knowledge_stats[student_id], sub_knowledge_stats[student_id])
+                else:
+                    results[student_id]['knowledge'] = {'status': 'error',
+                                                        'message': f'没有找到学生 {student_id} 的提交记录'}
+        
+        if 'behavior' in analysis_types:
+            histograms = self.data_service.get_behavior_histograms()
+            student_totals = student_cube.rollup(['student_ID'], primary_only=True)
+            students = self.data_service.get_students_df()
+            students = students[students['student_ID'].isin(student_ids)].drop_duplicates('student_ID')
+            student_infos = {row['student_ID']: row.to_dict() for _, row in students.iterrows()}
+            for student_id in student_ids:
+                if student_id not in student_totals.index or student_id not in histograms:
+                    results[student_id]['behavior'] = {'status': 'error',
+                                                       'message': f'没有找到学生 {student_id} 的提交记录'}
+                    continue
+                totals = student_totals.loc[student_id].astype(np.float64)
+                student_info = student_infos.get(student_id, {'student_ID': student_id})
+                results[student_id]['behavior'] = self._behavior_result(
+                    student_id, student_info, totals, self._histogram_distributions(histograms, student_id))
+        
+        if 'timeseries' in analysis_types:
+            fact_tables = self.data_service.get_student_fact_tables(student_ids)
+            for student_id in student_ids:
+                if fact_tables[student_id].empty:
+                    results[student_id]['timeseries'] = {'status': 'error',
+                                                         'message': f'没有找到学生 {student_id} 的提交记录'}
+                    continue
+                results[student_id]['timeseries'] = self._timeseries_result(
+                    student_id, fact_tables[student_id], format, bucket, max_points)
+        
+        return {
+            'status': 'success',
+            'analysis_types': list(analysis_types),
+            'results': results
+        }
+    
+    @cached_result
+    def get_dashboard_summary(self, weak_point_count=5):
+        """仪表盘概览统计
+        
+        全部由预聚合立方体和行为直方图计算，不需要向前端传输提交记录。
+        
+        Args:
+            weak_point_count: 返回的薄弱知识点数量（按平均掌握程度从低到高）
+            
+        Returns:
+            包含totals、class_counts、state_distribution、hour_distribution、weekday_distribution、
+            daily_activity和weak_knowledge_points的字典
+        """
+        cube = self.data_service.get_aggregate_cube()
+        histograms = self.data_service.get_behavior_histograms()
+        if cube.empty or histograms.empty:
+            return {'status': 'error', 'message': '没有找到提交记录数据'}
+        
+        # 总体统计（按提交计数）
+        totals = cube.totals(primary_only=True)
+        summary_totals = {
+            'students': len(self.data_service.get_students_df()),
+            'questions': len(self.data_service.get_questions_df()),
+            'submissions': int(totals['count']),
+            'active_students': len(histograms.students),
+            'average_mastery': float(AggregateCube.mean(totals, 'mastery')),
+            'correct_rate': float(totals['correct'] / totals['count']) if totals['count'] else 0.0
+        }
+        
+        # 各班级的提交数和学生数
+        class_stats = cube.rollup(['class'], primary_only=True)
+        student_counts = cube.rollup(['class', 'student_ID'], primary_only=True).reset_index().groupby(
+            'class', observed=True).size()
+        classes = sorted((class_id for class_id in self.data_service.get_class_ids()
+                          if class_id in class_stats.index), key=natural_sort_key)
+        class_counts = [{
+            'class_id': class_id,
+            'submissions': int(class_stats.at[class_id, 'count']),
+            'students': int(student_counts.get(class_id, 0))
+        } for class_id in classes]
+        
+        # 提交次数分布（北京时间）
+        distributions = self._histogram_distributions(histograms, None)
+        state_distribution = {state: int(count) for state, count in distributions['state'].items() if count > 0}
+        hour_distribution = [{'hour': int(hour), 'count': int(count)} for hour, count in distributions['hour'].items()]
+        weekday_distribution = [{'weekday': int(weekday), 'count': int(count)}
+                                for weekday, count in distributions['weekday'].items()]
+        
+        # 每日提交数（北京时间日期）
+        days = cube.rollup(['day'], primary_only=True)['count']
+        dates = pd.to_datetime(days.index.to_numpy(np.int64), unit='D').strftime('%Y-%m-%d')
+        daily_activity = [{'date': date, 'count': int(count)} for date, count in zip(dates, days.to_numpy())]
+        
+        # 平均掌握程度最低的知识点
+        knowledge_stats = self._aggregate_knowledge_stats(cube, ['knowledge'])
+        knowledge_stats = knowledge_stats[knowledge_stats.index != '未知']
+        weak_knowledge_points = [{
+            'knowledge': knowledge,
+            'mastery_level': float(stats['correct_rate']),
+            'correct_submission_rate': float(stats['correct_submission_rate']),
+            'total_submissions': int(stats['total_submissions'])
+        } for knowledge, stats in knowledge_stats.sort_values('correct_rate', kind='stable').head(
+            weak_point_count).iterrows()]
+        
+        return {
+            'status': 'success',
+            'totals': summary_totals,
+            'class_counts': class_counts,
+            'state_distribution': state_distribution,
+            'hour_distribution': hour_distribution,
+            'weekday_distribution': weekday_distribution,
+            'daily_activity': daily_activity,
+            'weak_knowledge_points': weak_knowledge_points
+        }
+    
+    @cached_result
+    def analyze_class_comparison(self):
+        """跨班级对比：班级×知识点的平均掌握程度、正确提交率和提交次数矩阵
+        
+        矩阵由聚合立方体按 班级×知识点 上卷一次得到，班级概况按提交计数上卷。
+        班级按编号排序，只包含有提交记录文件的班级；班级没有提交的知识点在掌握程度和
+        正确率矩阵中为None，提交次数为0。
+        
+        Returns:
+            包含classes、knowledge、mastery、accuracy、activity和class_summary的字典
+        """
+        cube = self.data_service.get_aggregate_cube()
+        if cube.empty:
+            return {'status': 'error', 'message': '没有找到提交记录数据'}
+        
+        class_stats = cube.rollup(['class'], primary_only=True)
+        classes = sorted((class_id for class_id in self.data_service.get_class_ids()
+                          if class_id in class_stats.index), key=natural_sort_key)
+        if not classes:
+            return {'status': 'error', 'message': '没有找到班级提交记录'}
+        
+        # 班级×知识点矩阵（统计全部关联记录，与知识点掌握度分析一致）
+        stats = cube.rollup(['class', 'knowledge'])
+        knowledge = sorted(set(stats.index.get_level_values('knowledge').astype(object)))
+        def matrix(values, fill_value=np.nan):
+            return values.unstack('knowledge').reindex(index=classes, columns=knowledge).fillna(fill_value)
+        def to_lists(frame):
+            values = frame.to_numpy(dtype=object)
+            return np.where(pd.isna(values), None, values).tolist()
+        
+        mastery = matrix(AggregateCube.mean(stats, 'mastery'))
+        accuracy = matrix(stats['correct'] / stats['count'])
+        activity = matrix(stats['count'], fill_value=0).astype(int)
+        
+        # 班级概况：提交数、学生数、平均掌握程度、正确提交率和平均用时
+        student_counts = cube.rollup(['class', 'student_ID'], primary_only=True).reset_index().groupby(
+            'class', observed=True).size()
+        class_stats = class_stats.reindex(classes)
+        class_mastery = AggregateCube.mean(class_stats, 'mastery')
+        class_time = AggregateCube.mean(class_stats, 'timeconsume')
+        class_summary = [{
+            'class_id': class_id,
+            'total_submissions': int(class_stats.at[class_id, 'count']),
+            'student_count': int(student_counts.get(class_id, 0)),
+            'avg_mastery': float(class_mastery[class_id]),
+            'correct_rate': float(class_stats.at[class_id, 'correct'] / class_stats.at[class_id, 'count']),
+            'avg_time_consume': float(class_time[class_id])
+        } for class_id in classes]
+        
+        return {
+            'status': 'success',
+            'classes': classes,
+            'knowledge': knowledge,
+            'mastery': to_lists(mastery),
+            'accuracy': to_lists(accuracy),
+            'activity': activity.to_numpy().tolist(),
+            'class_summary': class_summary
+        }
+    
+    def get_class_report_data(self, class_ids=None, analysis_types=CLASS_ANALYSIS_TYPES):
+        """生成班级报告所需的分析数据（全部由服务端计算）
+        
+        Args:
+            class_ids: 班级ID列表，为空时分析全体学生
+            analysis_types: 分析类型列表，可选'knowledge'、'behavior'、'difficulty'，不支持的类型忽略
+            
+        Returns:
+            包含class_comparison，以及classes（班级ID -> 分析类型 -> 分析结果）或overall（全体学生的分析结果）的字典
+        """
+        analyses = {
+            'knowledge': self.analyze_knowledge_mastery,
+            'behavior': self.analyze_learning_behavior,
+            'difficulty': self.analyze_question_difficulty
+        }
+        analysis_types = [analysis_type for analysis_type in analysis_types if analysis_type in analyses]
+        
+        report_data = {'class_comparison': self.analyze_class_comparison()}
+        if class_ids:
+            report_data['classes'] = {
+                class_id: {analysis_type: analyses[analysis_type](class_id=class_id) for analysis_type in analysis_types}
+                for class_id in class_ids
+            }
+        else:
+            report_data['overall'] = {analysis_type: analyses[analysis_type]() for analysis_type in analysis_types}
+        return report_data
+    
+    def analyze_question_difficulty_frame(self, class_id=None):
+        """题目难度分析的扁平表形式，供Arrow等按列格式直接输出
+        
+        每行为一道题目，列与question_difficulty中的字段相同，另有unreasonable
+        （是否为不合理题目）和reason（不合理的原因）两列。
+        
+        Args:
+            class_id: 同analyze_question_difficulty
+            
+        Returns:
+            包含frame（DataFrame）的结果字典
+        """
+        result = self.analyze_question_difficulty(class_id=class_id)
+        if result['status'] == 'error':
+            return result
+        
+        frame = pd.DataFrame.from_records(
+            list(result['question_difficulty'].values()),
+            columns=['title_id', 'correct_rate', 'avg_time_consume', 'avg_memory', 'total_submissions',
+                     'correct_submissions', 'score', 'knowledge', 'sub_knowledge', 'avg_mastery'])
+        reasons = {question['title_id']: question['reason'] for question in result['unreasonable_questions']}
+        frame['unreasonable'] = frame['title_id'].isin(list(reasons))
+        frame['reason'] = frame['title_id'].map(reasons)
+        
+        frame_result = {'status': 'success', 'frame': frame}
+        if class_id:
+            frame_result['class_id'] = class_id
+        return frame_result
+    
+    @cached_result
+    def analyze_question_difficulty(self, class_id=None):
         """分析题目难度，识别不合理的题目
         
+        Args:
+            class_id: 班级ID，为None时分析所有班级，否则只分析该班级（按提交记录的class列）
+            
         Returns:
             题目难度分析结果
         """
-        # 获取所有提交记录
-        all_submissions = pd.DataFrame(self.data_service.get_all_submissions())
-        if all_submissions.empty:
+        # 获取预聚合立方体
+        cube = self.data_service.get_aggregate_cube()
+        if cube.empty:
             return {'status': 'error', 'message': '没有找到提交记录数据'}
         
         # 获取题目信息
-        questions = pd.DataFrame(self.data_service.get_questions())
+        questions = self.data_service.get_questions_df()
         if questions.empty:
             return {'status': 'error', 'message': '没有找到题目数据'}
         
         # 获取学生信息
-        students = pd.DataFrame(self.data_service.get_students())
+        students = self.data_service.get_students_df()
         if students.empty:
             return {'status': 'error', 'message': '没有找到学生数据'}
         
+        if class_id:
+            cube = cube.for_class(class_id)
+            if cube.empty:
+                return {'status': 'error', 'message': f'没有找到班级 {class_id} 的提交记录'}
+        
+        # 由立方体上卷得到各题目的提交统计（按提交计数，题目按编码顺序）
+        title_stats = cube.rollup(['title_ID'], primary_only=True)
+        avg_time_consume = AggregateCube.mean(title_stats, 'timeconsume')
+        avg_memory = AggregateCube.mean(title_stats, 'memory')
+        # 题目平均掌握程度与逐条求平均一致，含缺失值时结果为NaN
+        avg_title_mastery = AggregateCube.mean(title_stats, 'mastery').where(
+            title_stats['mastery_count'] == title_stats['count'])
+        
+        # 题目分数和知识点取题目信息中该题的第一条记录
+        question_info = questions.drop_duplicates('title_ID').set_index('title_ID')
+        
         # 计算每个题目的难度指标
         question_difficulty = {}
-        for title_id, group in all_submissions.groupby('title_ID'):
-            # 计算该题目的提交次数和正确提交次数
-            total_submissions = len(group)
-            correct_submissions = len(group[group['state'] == 'Absolutely_Correct'])
-            
+        for title_id, stats in title_stats.iterrows():
             # 计算正确率
-            correct_rate = correct_submissions / total_submissions if total_submissions > 0 else 0
-            
-            # 计算平均用时和平均内存使用
-            group_copy = group.copy()
-            group_copy.loc[:, 'timeconsume'] = group_copy['timeconsume'].replace(['--', '-'], np.nan).infer_objects(copy=False)
-            group_copy.loc[:, 'timeconsume'] = pd.to_numeric(group_copy['timeconsume'], errors='coerce')
-            avg_time_consume = group_copy['timeconsume'].mean()
-            avg_memory = group[group['memory'] > 0]['memory'].mean()
+            correct_rate = int(stats['correct']) / int(stats['count'])
             
             # 获取题目分数和知识点
-            question_info = questions[questions['title_ID'] == title_id]
-            if not question_info.empty:
-                score = question_info.iloc[0]['score']
-                knowledge = question_info.iloc[0]['knowledge']
-                sub_knowledge = question_info.iloc[0]['sub_knowledge']
+            if title_id in question_info.index:
+                info = question_info.loc[title_id]
+                score = info['score']
+                knowledge = info['knowledge']
+                sub_knowledge = info['sub_knowledge']
             else:
                 score = 0
                 knowledge = '未知'
                 sub_knowledge = '未知'
             
-            # 计算该题目的平均掌握程度
-            # 获取所有做过这道题的学生的掌握程度
-            title_mastery_levels = group['Mastery'].tolist()
-            avg_mastery = np.mean(title_mastery_levels) if title_mastery_levels else 0
-            
             # 存储题目难度信息
             question_difficulty[title_id] = {
                 'title_id': title_id,
                 'correct_rate': correct_rate,
-                'avg_time_consume': avg_time_consume,
-                'avg_memory': avg_memory,
-                'total_submissions': total_submissions,
-                'correct_submissions': correct_submissions,
+                'avg_time_consume': float(avg_time_consume[title_id]),
+                'avg_memory': float(avg_memory[title_id]),
+                'total_submissions': int(stats['count']),
+                'correct_submissions': int(stats['correct']),
                 'score': score,
                 'knowledge': knowledge,
                 'sub_knowledge': sub_knowledge,
-                'avg_mastery': avg_mastery
+                'avg_mastery': float(avg_title_mastery[title_id])
             }
         
-        # 分析学生的知识掌握程度
-        student_knowledge = {}
-        for student_id, group in all_submissions.groupby('student_ID'):
-            # 合并提交记录和题目信息
-            student_submissions = pd.merge(group, questions, on='title_ID', how='left')
-            
-            # 按知识点分组计算掌握程度（使用已计算的Mastery列的平均值）
-            knowledge_mastery = {}
-            for knowledge, k_group in student_submissions.groupby('knowledge'):
-                # 使用已计算好的Mastery列的平均值作为知识点掌握程度
-                mastery = k_group['Mastery'].mean() if not k_group['Mastery'].empty else 0
-                knowledge_mastery[knowledge] = mastery
-            
-            student_knowledge[student_id] = knowledge_mastery
+        # 学生×知识点掌握程度（Mastery平均值），只包含学生做过的知识点
+        student_knowledge = cube.rollup(['student_ID', 'knowledge'])
+        student_knowledge = pd.DataFrame({
+            'student_ID': student_knowledge.index.get_level_values('student_ID').astype(object),
+            'knowledge': student_knowledge.index.get_level_values('knowledge').astype(object),
+            'mastery': AggregateCube.mean(student_knowledge, 'mastery').to_numpy()
+        })
+        
+        # 识别不合理的题目：正确率低于30%的题目的作答学生与其在该题知识点上的掌握程度做一次连接
+        low_titles = pd.DataFrame([
+            {'title_ID': title_id, 'knowledge': difficulty['knowledge']}
+            for title_id, difficulty in question_difficulty.items() if difficulty['correct_rate'] < 0.3
+        ], columns=['title_ID', 'knowledge'])
+        attempts = cube.rollup(['title_ID', 'student_ID'], primary_only=True).index.to_frame(index=False)
+        attempts = attempts.astype(object).merge(low_titles, on='title_ID')
+        attempts = attempts.merge(student_knowledge, on=['student_ID', 'knowledge'])
+        
+        # 计算这些学生在该知识点上的平均掌握程度，没有相关掌握数据时为0，含缺失值时为NaN
+        title_mastery = attempts.groupby('title_ID', sort=False)['mastery'].agg(
+            lambda values: values.to_numpy().mean())
         
-        # 识别不合理的题目
         unreasonable_questions = []
-        for title_id, difficulty in question_difficulty.items():
-            if difficulty['correct_rate'] < 0.3:  # 正确率低于30%
-                # 检查做这道题的学生在相关知识点上的平均掌握程度
-                knowledge = difficulty['knowledge']
-                students_attempted = all_submissions[all_submissions['title_ID'] == title_id]['student_ID'].unique()
-                
-                # 计算这些学生在该知识点上的平均掌握程度
-                knowledge_mastery_levels = []
-                for student_id in students_attempted:
-                    if student_id in student_knowledge and knowledge in student_knowledge[student_id]:
-                        knowledge_mastery_levels.append(student_knowledge[student_id][knowledge])
-                
-                avg_mastery = np.mean(knowledge_mastery_levels) if knowledge_mastery_levels else 0
-                
-                # 如果学生知识掌握程度高但题目正确率低，则认为题目难度不合理
-                if avg_mastery > 0.37 and difficulty['correct_rate'] < 0.22:
-                    unreasonable_questions.append({
-                        'title_id': title_id,
-                        'correct_rate': difficulty['correct_rate'],
-                        'avg_mastery': avg_mastery,
-                        'knowledge': knowledge,
-                        'sub_knowledge': difficulty['sub_knowledge'],
-                        'score': difficulty['score'],
-                        'reason': '学生知识掌握程度高但题目正确率低'
-                    })
+        for title_id in low_titles['title_ID']:
+            difficulty = question_difficulty[title_id]
+            avg_mastery = float(title_mastery[title_id]) if title_id in title_mastery.index else 0
+            
+            # 如果学生知识掌握程度高但题目正确率低，则认为题目难度不合理
+            if avg_mastery > 0.37 and difficulty['correct_rate'] < 0.22:
+                unreasonable_questions.append({
+                    'title_id': title_id,
+                    'correct_rate': difficulty['correct_rate'],
+                    'avg_mastery': avg_mastery,
+                    'knowledge': difficulty['knowledge'],
+                    'sub_knowledge': difficulty['sub_knowledge'],
+                    'score': difficulty['score'],
+                    'reason': '学生知识掌握程度高但题目正确率低'
+                })
         
-        return {
+        result = {
             'status': 'success',
             'question_difficulty': question_difficulty,
             'unreasonable_questions': unreasonable_questions
         }
+        if class_id:
+            result['class_id'] = class_id
+        return result
+    
         """生成掌握程度分析结果文件
         
         Args:
@@ -661,8 +1169,8 @@ class AnalysisService:
             
             # 获取所有提交记录和题目信息
             print("获取提交记录和题目信息...")
-            all_submissions = pd.DataFrame(self.data_service.get_all_submissions())
-            questions = pd.DataFrame(self.data_service.get_questions())
+            all_submissions = self.data_service.get_all_submissions_df()
+            questions = self.data_service.get_questions_df()
             
             print(f"获取到 {len(all_submissions)} 条提交记录")
             print(f"获取到 {len(questions)} 条题目信息")
@@ -676,7 +1184,7 @@ class AnalysisService:
             
             # 如果指定了学生ID，则只分析该学生的数据
             if student_id:
-                all_submissions = all_submissions[all_submissions['student_ID'] == student_id]
+                all_submissions = self.data_service.get_submissions_df(student_id=student_id)
                 if all_submissions.empty:
                     return {
                         'status': 'error',
@@ -703,8 +1211,8 @@ class AnalysisService:
                 try:
                     print("生成每个学生对每个题目的掌握程度...")
                     student_title_mastery = []
-                    for student_id, group in merged_data.groupby('student_ID'):
-                        for title_id, title_group in group.groupby('title_ID'):
+                    for student_id, group in merged_data.groupby('student_ID', observed=True):
+                        for title_id, title_group in group.groupby('title_ID', observed=True):
                             # 计算该题目的掌握程度
                             total_score = 0
                             earned_score = 0
@@ -745,7 +1253,7 @@ class AnalysisService:
                 try:
                     print("生成每个学生对每个子知识点的掌握程度...")
                     student_subknowledge_mastery = []
-                    for student_id, group in merged_data.groupby('student_ID'):
+                    for student_id, group in merged_data.groupby('student_ID', observed=True):
                         for sub_knowledge, sub_group in group.groupby('sub_knowledge'):
                             total_score = 0
                             earned_score = 0
@@ -787,7 +1295,7 @@ class AnalysisService:
                 try:
                     print("生成每个学生对每个知识点的掌握程度...")
                     student_knowledge_mastery = []
-                    for student_id, group in merged_data.groupby('student_ID'):
+                    for student_id, group in merged_data.groupby('student_ID', observed=True):
                         for knowledge, k_group in group.groupby('knowledge'):
                             # 获取该知识点下的所有子知识点
                             sub_knowledges = k_group['sub_knowledge'].unique()
@@ -852,7 +1360,7 @@ class AnalysisService:
                 try:
                     print("生成学生整体对每个题目的掌握程度...")
                     title_mastery = []
-                    for title_id, group in merged_data.groupby('title_ID'):
+                    for title_id, group in merged_data.groupby('title_ID', observed=True):
                         total_score = 0
                         earned_score = 0
                         time_consumes = []
@@ -0,0 +1,73 @@
+# Arrow导出模块 - 将DataFrame序列化为Arrow IPC流格式，供批量数据接口按列输出
+
+import io
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    # 未安装pyarrow时接口只提供JSON格式
+    pa = None
+    ARROW_AVAILABLE = False
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+
+def _to_table(frame, schema=None):
+    """DataFrame按列转换为Arrow表，数值列直接复用缓冲区，分类列转换为字典编码列"""
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def frame_to_ipc(frame):
+    """
+    将DataFrame序列化为Arrow IPC流
+
+    Args:
+        frame: 要序列化的DataFrame
+
+    Returns:
+        Arrow IPC流格式的字节串
+    """
+    table = _to_table(frame)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def iter_ipc_stream(frames, empty_frame):
+    """
+    将多个结构相同的DataFrame逐批写为一个Arrow IPC流，每批写出后立即产出字节，内存占用与总行数无关
+
+    分类列的取值（字典）在各批之间应保持一致，如同一张合并表的行切片。
+
+    Args:
+        frames: DataFrame的可迭代对象
+        empty_frame: 结构相同的空DataFrame，没有任何批次时用于写出表结构
+
+    Yields:
+        Arrow IPC流的字节片段
+    """
+    sink = io.BytesIO()
+    writer = None
+    schema = None
+
+    def flush():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    for frame in frames:
+        table = _to_table(frame, schema)
+        if writer is None:
+            schema = table.schema
+            writer = pa.ipc.new_stream(sink, schema)
+        writer.write_table(table)
+        yield flush()
+
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, _to_table(empty_frame).schema)
+    writer.close()
+    yield flush()
+
@@ -0,0 +1,200 @@
+# 行为直方图模块 - 预计算每个学生的提交时段、星期、状态和方法分布
+
+import os
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# 直方图名称，hour和weekday的取值固定，state和method的取值来自数据
+HISTOGRAMS = ['hour', 'weekday', 'state', 'method']
+
+# 持久化文件名及格式版本（结构变化时递增，使旧文件失效）
+HISTOGRAMS_NAME = 'behavior_histograms'
+HISTOGRAMS_FORMAT_VERSION = 1
+
+BEIJING_UTC_OFFSET = 8 * 3600
+
+
+class BehaviorHistograms:
+    """按学生预计算的提交次数直方图
+
+    每个直方图是 学生数×取值数 的稠密计数矩阵：hour为北京时间0-23时，weekday为北京时间
+    星期一(0)到星期日(6)，state和method为数据中出现的答题状态和方法（按取值排序）。
+    单个学生的分布为矩阵的一行，全体学生的分布为各列之和。对象创建后不再修改，
+    追加新记录时merge返回新对象。
+    """
+
+    def __init__(self, students, labels, counts):
+        """
+        Args:
+            students: 有序的学生ID Index，对应矩阵的行
+            labels: 直方图名称 -> 取值Index，对应矩阵的列
+            counts: 直方图名称 -> int32计数矩阵
+        """
+        self.students = students
+        self.labels = labels
+        self.counts = counts
+
+    @staticmethod
+    def _fixed_labels():
+        return {'hour': pd.Index(range(24)), 'weekday': pd.Index(range(7))}
+
+    @classmethod
+    def build(cls, submissions):
+        """
+        由提交记录构建直方图
+
+        Args:
+            submissions: 包含student_ID、time、state、method列的提交记录
+
+        Returns:
+            BehaviorHistograms实例
+        """
+        labels = cls._fixed_labels()
+        if submissions.empty:
+            labels.update({'state': pd.Index([], dtype=object), 'method': pd.Index([], dtype=object)})
+            counts = {name: np.zeros((0, len(labels[name])), dtype=np.int32) for name in HISTOGRAMS}
+            return cls(pd.Index([], dtype=object), labels, counts)
+
+        # 分类列的取值按字符串排序，统一转换为object类型的Index
+        student_codes, students = pd.factorize(submissions['student_ID'], sort=True)
+        students = pd.Index(np.asarray(students, dtype=object))
+        local_seconds = submissions['time'].to_numpy(np.int64) + BEIJING_UTC_OFFSET
+        codes = {
+            'hour': (local_seconds // 3600) % 24,
+            # 1970-01-01是星期四
+            'weekday': (local_seconds // 86400 + 3) % 7,
+        }
+        for name in ('state', 'method'):
+            codes[name], values = pd.factorize(submissions[name], sort=True)
+            labels[name] = pd.Index(np.asarray(values, dtype=object))
+
+        counts = {}
+        for name in HISTOGRAMS:
+            width = len(labels[name])
+            valid = (student_codes >= 0) & (codes[name] >= 0)
+            flat = student_codes[valid].astype(np.int64) * width + codes[name][valid]
+            counts[name] = np.bincount(flat, minlength=len(students) * width).reshape(
+                len(students), width).astype(np.int32)
+        return cls(students, labels, counts)
+
+    def merge(self, other):
+        """
+        合并另一组直方图（如新提交记录构建的直方图），返回新的对象
+
+        Args:
+            other: 新数据的BehaviorHistograms
+
+        Returns:
+            合并后的BehaviorHistograms，原对象不变
+        """
+        students = self.students.union(other.students)
+        labels = {}
+        counts = {}
+        for name in HISTOGRAMS:
+            labels[name] = self.labels[name].union(other.labels[name])
+            merged = np.zeros((len(students), len(labels[name])), dtype=np.int32)
+            for source in (self, other):
+                rows = students.get_indexer(source.students)
+                columns = labels[name].get_indexer(source.labels[name])
+                merged[np.ix_(rows, columns)] += source.counts[name]
+            counts[name] = merged
+        return BehaviorHistograms(students, labels, counts)
+
+    def __contains__(self, student_id):
+        return student_id in self.students
+
+    @property
+    def empty(self):
+        return len(self.students) == 0
+
+    def distribution(self, name, student_id=None):
+        """
+        获取一个直方图的分布
+
+        Args:
+            name: 直方图名称（hour、weekday、state、method）
+            student_id: 学生ID，为None时为全体学生之和
+
+        Returns:
+            以取值为索引的计数Series，学生不存在时为全0
+        """
+        matrix = self.counts[name]
+        if student_id is None:
+            values = matrix.sum(axis=0, dtype=np.int64)
+        else:
+            row = self.students.get_indexer([student_id])[0]
+            values = matrix[row].astype(np.int64) if row >= 0 else np.zeros(matrix.shape[1], dtype=np.int64)
+        return pd.Series(values, index=self.labels[name])
+
+    def memory_usage(self):
+        """直方图占用的字节数"""
+        return int(sum(matrix.nbytes for matrix in self.counts.values())
+                   + self.students.memory_usage(deep=True)
+                   + sum(index.memory_usage(deep=True) for index in self.labels.values()))
+
+    @staticmethod
+    def _paths(cache_dir):
+        cache_dir = Path(cache_dir)
+        return cache_dir / (HISTOGRAMS_NAME + '.npz'), cache_dir / (HISTOGRAMS_NAME + '.json')
+
+    def save(self, cache_dir, version):
+        """
+        持久化直方图（临时文件+重命名），元数据记录对应的数据版本
+
+        Args:
+            cache_dir: 缓存目录
+            version: 构建直方图时的数据版本
+        """
+        data_path, meta_path = self._paths(cache_dir)
+        try:
+            os.makedirs(data_path.parent, exist_ok=True)
+            tmp_path = data_path.with_name(f'{data_path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, students=self.students.to_numpy(dtype=str),
+                         state_labels=self.labels['state'].to_numpy(dtype=str),
+                         method_labels=self.labels['method'].to_numpy(dtype=str),
+                         **self.counts)
+            os.replace(tmp_path, data_path)
+
+            tmp_path = meta_path.with_name(f'{meta_path.name}.{os.getpid()}.tmp')
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'version': version, 'format_version': HISTOGRAMS_FORMAT_VERSION,
+                           'students': len(self.students)}, f)
+            os.replace(tmp_path, meta_path)
+            return True
+        except Exception as e:
+            print(f"保存行为直方图失败: {e}")
+            return False
+
+    @classmethod
+    def load(cls, cache_dir, version):
+        """
+        读取持久化的直方图
+
+        Args:
+            cache_dir: 缓存目录
+            version: 当前数据版本
+
+        Returns:
+            与数据版本一致的BehaviorHistograms，不存在或已过期时返回None
+        """
+        data_path, meta_path = cls._paths(cache_dir)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('version') != version or meta.get('format_version') != HISTOGRAMS_FORMAT_VERSION:
+                return None
+            with np.load(data_path, allow_pickle=False) as data:
+                students = pd.Index(data['students'].astype(object))
+                labels = {**cls._fixed_labels(),
+                          'state': pd.Index(data['state_labels'].astype(object)),
+                          'method': pd.Index(data['method_labels'].astype(object))}
+                counts = {name: data[name] for name in HISTOGRAMS}
+        except (OSError, ValueError, KeyError):
+            return None
+        except Exception as e:
+            print(f"读取行为直方图失败: {e}")
+            return None
+        return cls(students, labels, counts)
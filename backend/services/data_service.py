@@ -1,25 +1,435 @@
 # 数据服务模块 - 负责数据加载和预处理
 
 import os
+import re
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
+from pandas.api.types import union_categoricals
 from pathlib import Path
+from services.submission_cache import SubmissionCache, read_submission_csv
+from services.mastery import compute_submission_mastery, title_total_scores
+from services.aggregate_cube import AggregateCube
+from services.behavior_histograms import BehaviorHistograms
+
+# 环境变量EDU_LOAD_WORKERS可覆盖提交记录文件的并行加载线程数
+LOAD_WORKERS_ENV = 'EDU_LOAD_WORKERS'
+
+# 字典编码的提交记录列（使用共享词表的Categorical类型存储）
+CATEGORICAL_COLUMNS = ['student_ID', 'title_ID', 'method', 'state', 'class']
+
+# 追加提交记录时必须提供的字段，班级ID同时用作文件名的一部分
+SUBMISSION_FIELDS = ['class', 'time', 'state', 'score', 'title_ID', 'method', 'memory', 'timeconsume', 'student_ID']
+CLASS_ID_PATTERN = re.compile(r'^[A-Za-z0-9_]+$')
+
+# 全部提交记录接口的默认和最大分页大小
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# 流式导出提交记录时每批转换的行数
+STREAM_BATCH_SIZE = 2000
+
+# 进程内共享的数据服务实例
+_shared_data_service = None
+_shared_data_service_lock = threading.Lock()
+
+def get_data_service():
+    """获取进程内共享的数据服务实例
+    
+    所有服务共用同一份数据缓存，每个数据文件在进程内只加载一次。
+    
+    Returns:
+        共享的DataService实例
+    """
+    global _shared_data_service
+    if _shared_data_service is None:
+        with _shared_data_service_lock:
+            if _shared_data_service is None:
+                _shared_data_service = DataService()
+    return _shared_data_service
+
+class RowIndex:
+    """分类编码到行号的倒排索引
+    
+    以CSR结构存储：rows按编码分段排列，每段内行号升序，
+    pointers[code]:pointers[code + 1]即该编码对应的行号区间。
+    """
+    
+    def __init__(self, codes, size):
+        codes = np.asarray(codes)
+        valid = codes >= 0
+        valid_codes = codes[valid]
+        self.rows = np.flatnonzero(valid)[np.argsort(valid_codes, kind='stable')]
+        self.pointers = np.concatenate([[0], np.cumsum(np.bincount(valid_codes, minlength=size))])
+        self.size = size
+    
+    def get(self, code):
+        """获取编码对应的升序行号数组，未知编码返回空数组"""
+        if code < 0 or code >= self.size:
+            return self.rows[:0]
+        return self.rows[self.pointers[code]:self.pointers[code + 1]]
+    
+    def counts(self):
+        """各编码对应的行数"""
+        return np.diff(self.pointers)
+    
+    def extended(self, codes, start, size, mapping=None):
+        """追加一批新行，返回新的索引（原索引不修改）
+        
+        新行的行号从start开始且大于已有行号，插入到各编码段的末尾后段内仍然升序，
+        不需要重新排序已有的行号。
+        
+        Args:
+            codes: 新行的编码（新词表下）
+            start: 第一个新行的行号
+            size: 新词表的大小
+            mapping: 旧编码 -> 新编码的数组（词表新增取值后编码变化时），为None表示编码不变
+        """
+        counts = np.zeros(size, dtype=np.int64)
+        if mapping is None:
+            counts[:self.size] = self.counts()
+        else:
+            # 新词表仍然有序，旧编码的相对顺序不变，各编码段按原顺序排列
+            counts[mapping] = self.counts()
+        pointers = np.concatenate([[0], np.cumsum(counts)])
+        
+        codes = np.asarray(codes)
+        valid = codes >= 0
+        order = np.argsort(codes[valid], kind='stable')
+        new_codes = codes[valid][order]
+        new_rows = (np.flatnonzero(valid) + start)[order]
+        
+        index = RowIndex.__new__(RowIndex)
+        index.rows = np.insert(self.rows, pointers[new_codes + 1], new_rows)
+        index.pointers = pointers + np.concatenate([[0], np.cumsum(np.bincount(new_codes, minlength=size))])
+        index.size = size
+        return index
+
+class SubmissionSnapshot:
+    """提交记录合并表及其派生索引的不可变快照
+    
+    合并表、共享词表、学生/题目/知识点行号索引、班级行区间和数据版本一起构建，
+    构建完成后通过一次赋值整体发布，之后不再修改。读者每次调用只取一次快照引用，
+    追加记录或重新加载时替换为新快照，已持有旧快照的读者继续看到一致的旧数据。
+    事实表由快照自身的合并表按需构建，构建成功后与其学生索引作为一个元组发布到fact_state。
+    追加记录时新快照的合并表为旧合并表末尾接上新行，行号索引在旧快照的索引上追加新行。
+    """
+    
+    def __init__(self, version, submissions, vocabularies, class_ranges, questions, previous=None):
+        """
+        Args:
+            version: 构建快照时的数据版本
+            submissions: 合并后的紧凑提交记录表
+            vocabularies: 分类列名 -> 有序的取值Index
+            class_ranges: 班级ID -> 该班级文件的记录在合并表中的行区间列表[(start, stop), ...]
+                          （按文件构建时每个班级一个区间，每次追加的记录在末尾形成新区间）
+            questions: 构建快照时的题目信息（知识点索引和事实表据此构建）
+            previous: 追加记录前的快照，指定时submissions的前len(previous.submissions)行
+                      与其相同，索引只追加新行
+        """
+        self.version = version
+        self.submissions = submissions
+        self.vocabularies = vocabularies
+        self.class_ranges = class_ranges
+        self.questions = questions
+        self.fact_state = None  # (事实表, 学生行号索引)
+        
+        self.student_index = None
+        self.title_index = None
+        self.class_index = None
+        self.knowledge_index = {}
+        self.sub_knowledge_index = {}
+        if submissions.empty:
+            return
+        if previous is not None and previous.student_index is not None:
+            self._extend_indexes(previous)
+        else:
+            self._build_indexes()
+    
+    def _knowledge_titles(self):
+        """知识点和从属知识点 -> 包含的题目ID集合（同一题目可属于多个知识点）"""
+        knowledge_titles = {}
+        sub_knowledge_titles = {}
+        if not self.questions.empty:
+            for title_id, knowledge, sub_knowledge in self.questions[
+                    ['title_ID', 'knowledge', 'sub_knowledge']].itertuples(index=False):
+                knowledge_titles.setdefault(knowledge, set()).add(title_id)
+                sub_knowledge_titles.setdefault(sub_knowledge, set()).add(title_id)
+        return knowledge_titles, sub_knowledge_titles
+    
+    def _build_indexes(self):
+        """构建学生、题目、班级（class列）、知识点到行号的索引"""
+        self.student_index = RowIndex(self.submissions['student_ID'].cat.codes.to_numpy(),
+                                      len(self.vocabularies['student_ID']))
+        self.title_index = RowIndex(self.submissions['title_ID'].cat.codes.to_numpy(),
+                                    len(self.vocabularies['title_ID']))
+        self.class_index = RowIndex(self.submissions['class'].cat.codes.to_numpy(),
+                                    len(self.vocabularies['class']))
+        
+        # 知识点索引由其包含题目的行号合并而成
+        knowledge_titles, sub_knowledge_titles = self._knowledge_titles()
+        
+        def merge_rows(title_ids):
+            codes = self.vocabularies['title_ID'].get_indexer(list(title_ids))
+            return np.sort(np.concatenate([self.title_index.get(code) for code in codes]))
+        
+        self.knowledge_index = {k: merge_rows(t) for k, t in knowledge_titles.items()}
+        self.sub_knowledge_index = {k: merge_rows(t) for k, t in sub_knowledge_titles.items()}
+    
+    def _extend_indexes(self, previous):
+        """在追加前快照的索引上追加新行（新行位于合并表末尾，行号大于已有行号）"""
+        start = len(previous.submissions)
+        
+        def extend(index, column):
+            vocabulary = self.vocabularies[column]
+            previous_vocabulary = previous.vocabularies[column]
+            mapping = None
+            if not vocabulary.equals(previous_vocabulary):
+                mapping = vocabulary.get_indexer(previous_vocabulary)
+            codes = self.submissions[column].cat.codes.to_numpy()[start:]
+            return index.extended(codes, start, len(vocabulary), mapping)
+        
+        self.student_index = extend(previous.student_index, 'student_ID')
+        self.title_index = extend(previous.title_index, 'title_ID')
+        self.class_index = extend(previous.class_index, 'class')
+        
+        # 新行按题目归入知识点，接在旧行号之后仍然升序
+        title_codes = self.submissions['title_ID'].cat.codes.to_numpy()[start:]
+        knowledge_titles, sub_knowledge_titles = self._knowledge_titles()
+        
+        def extend_rows(rows_by_key, titles_by_key):
+            empty = np.array([], dtype=np.int64)
+            extended = {}
+            for key, titles in titles_by_key.items():
+                codes = self.vocabularies['title_ID'].get_indexer(list(titles))
+                new_rows = np.flatnonzero(np.isin(title_codes, codes[codes >= 0])) + start
+                extended[key] = np.concatenate([rows_by_key.get(key, empty), new_rows])
+            return extended
+        
+        self.knowledge_index = extend_rows(previous.knowledge_index, knowledge_titles)
+        self.sub_knowledge_index = extend_rows(previous.sub_knowledge_index, sub_knowledge_titles)
+    
+    def vocabulary(self, column):
+        """分类列的共享词表"""
+        return self.vocabularies.get(column, pd.Index([], dtype=object))
+    
+    def encode(self, column, values):
+        """将取值编码为词表中的int32编码，未知取值编码为-1"""
+        vocabulary = self.vocabulary(column)
+        if np.isscalar(values) or values is None:
+            return np.int32(vocabulary.get_indexer([values])[0])
+        return vocabulary.get_indexer(pd.Index(values)).astype(np.int32)
+    
+    def student_rows(self, student_id):
+        """学生在合并表中的升序行号"""
+        if self.student_index is None:
+            return np.array([], dtype=np.int64)
+        return self.student_index.get(self.encode('student_ID', student_id))
+    
+    def title_rows(self, title_id):
+        """题目在合并表中的升序行号"""
+        if self.title_index is None:
+            return np.array([], dtype=np.int64)
+        return self.title_index.get(self.encode('title_ID', title_id))
+    
+    def class_rows(self, class_id):
+        """class列为该班级的提交在合并表中的升序行号"""
+        if self.class_index is None:
+            return np.array([], dtype=np.int64)
+        return self.class_index.get(self.encode('class', class_id))
+    
+    def file_rows(self, class_id):
+        """该班级文件中的记录在合并表中的升序行号"""
+        ranges = self.class_ranges.get(class_id, [])
+        if not ranges:
+            return np.array([], dtype=np.int64)
+        return np.concatenate([np.arange(start, stop) for start, stop in ranges])
+    
+    def in_file(self, rows, class_id):
+        """行号是否属于该班级文件中的记录（布尔数组）"""
+        mask = np.zeros(len(rows), dtype=bool)
+        for start, stop in self.class_ranges.get(class_id, []):
+            mask |= (rows >= start) & (rows < stop)
+        return mask
+    
+    def knowledge_rows(self, knowledge=None, sub_knowledge=None):
+        """知识点或从属知识点相关提交在合并表中的升序行号，同时指定时取交集"""
+        empty = np.array([], dtype=np.int64)
+        rows = None
+        if knowledge is not None:
+            rows = self.knowledge_index.get(knowledge, empty)
+        if sub_knowledge is not None:
+            sub_rows = self.sub_knowledge_index.get(sub_knowledge, empty)
+            rows = sub_rows if rows is None else np.intersect1d(rows, sub_rows, assume_unique=True)
+        return empty if rows is None else rows
+    
+    def select_rows(self, class_id=None, student_id=None, title_id=None, state=None,
+                    knowledge=None, sub_knowledge=None, start_time=None, end_time=None):
+        """按条件筛选提交记录，返回合并表中的升序行号（参数同DataService.select_submission_rows）"""
+        submissions = self.submissions
+        empty = np.array([], dtype=np.int64)
+        rows = None
+        
+        def intersect(rows, other):
+            return other if rows is None else np.intersect1d(rows, other, assume_unique=True)
+        
+        if student_id:
+            rows = intersect(rows, self.student_rows(student_id))
+        if title_id:
+            rows = intersect(rows, self.title_rows(title_id))
+        if knowledge or sub_knowledge:
+            rows = intersect(rows, self.knowledge_rows(knowledge or None, sub_knowledge or None))
+        if class_id:
+            rows = self.file_rows(class_id) if rows is None else rows[self.in_file(rows, class_id)]
+        if rows is None:
+            rows = np.arange(len(submissions))
+        
+        if state:
+            code = self.encode('state', state)
+            if code < 0:
+                return empty
+            rows = rows[submissions['state'].cat.codes.to_numpy()[rows] == code]
+        if start_time is not None or end_time is not None:
+            times = submissions['time'].to_numpy()[rows]
+            mask = np.ones(len(rows), dtype=bool)
+            if start_time is not None:
+                mask &= times >= start_time
+            if end_time is not None:
+                mask &= times <= end_time
+            rows = rows[mask]
+        return rows.astype(np.int64, copy=False)
+
+def default_load_workers():
+    """默认的提交记录加载线程数：环境变量优先，否则为CPU核数"""
+    try:
+        return max(1, int(os.environ[LOAD_WORKERS_ENV]))
+    except (KeyError, ValueError):
+        return os.cpu_count() or 1
 
 class DataService:
-    def __init__(self):
+    def __init__(self, load_workers=None, data_dir=None):
+        """
+        Args:
+            load_workers: 并行加载提交记录文件的线程数，为None时取环境变量EDU_LOAD_WORKERS或CPU核数
+            data_dir: 数据目录，为None时为项目根目录下的Data
+        """
         # 获取项目根目录
         self.root_dir = Path(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
-        self.data_dir = self.root_dir / 'Data'
+        self.data_dir = Path(data_dir) if data_dir is not None else self.root_dir / 'Data'
+        
+        # 提交记录的列式磁盘缓存
+        self._submission_cache = SubmissionCache(self.data_dir / 'Cache' / 'SubmitRecord')
+        self.load_workers = load_workers or default_load_workers()
+        self._load_timings = {}  # 班级ID -> 最近一次加载的行数和耗时
+        self._class_row_counts = {}  # 班级ID -> 提交记录文件中的记录数（追加记录时用于编号）
         
         # 数据缓存
         self._students_data = None
         self._questions_data = None
-        self._submissions_data = {}
+        
+        # 提交记录合并表、词表、行号索引和事实表的不可变快照（按需构建，数据变化时整体替换）
+        self._snapshot = None
+        
+        # 预聚合立方体，持久化在Data/Cache中，数据版本一致时重启后直接加载
+        self._aggregate_cube = None
+        
+        # 按学生预计算的行为直方图，同样持久化在Data/Cache中
+        self._behavior_histograms = None
+        
+        # 数据版本由数据文件的大小和修改时间计算，文件变化后自动重新加载
+        self.refresh_interval = 5.0  # 检查数据文件变化的最小间隔（秒），None表示不自动检查
+        self._data_signature = None
+        self._data_version = None
+        self._last_refresh_check = 0.0
+        
+        # 数据重新加载或追加后的回调（如清空分析结果缓存）
+        self._reload_listeners = []
+        
+        # 加载锁，保证多线程下每个文件只加载一次
+        self._lock = threading.RLock()
         
         # 初始化时加载基本数据
+        self._update_data_signature()
         self._load_students_data()
         self._load_questions_data()
     
+    def _data_files(self):
+        """数据服务依赖的全部数据文件"""
+        submit_dir = self.data_dir / 'Data_SubmitRecord'
+        return ([self.data_dir / 'Data_StudentInfo.csv', self.data_dir / 'Data_TitleInfo.csv']
+                + sorted(submit_dir.glob('SubmitRecord-*.csv')))
+    
+    def _compute_data_signature(self):
+        """根据数据文件的名称、大小和修改时间计算数据签名"""
+        signature = []
+        for file_path in self._data_files():
+            try:
+                stat = file_path.stat()
+            except OSError:
+                continue
+            signature.append((file_path.name, stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+    
+    def _update_data_signature(self):
+        self._data_signature = self._compute_data_signature()
+        self._data_version = hashlib.sha1(repr(self._data_signature).encode('utf-8')).hexdigest()[:16]
+        self._last_refresh_check = time.monotonic()
+    
+    @property
+    def data_version(self):
+        """当前加载数据的版本标识，数据文件变化后随之改变"""
+        return self._data_version
+    
+    def add_reload_listener(self, callback):
+        """注册数据变化回调，数据重新加载或追加提交记录后调用（无参数）"""
+        self._reload_listeners.append(callback)
+    
+    def _notify_reload(self):
+        for callback in list(self._reload_listeners):
+            try:
+                callback()
+            except Exception as e:
+                print(f"数据变化回调执行失败: {e}")
+    
+    def refresh_if_changed(self, force=False):
+        """检查数据文件是否变化，变化时重新加载
+        
+        Args:
+            force: 为True时忽略检查间隔立即检查
+            
+        Returns:
+            是否重新加载了数据
+        """
+        if not force:
+            if self.refresh_interval is None:
+                return False
+            if time.monotonic() - self._last_refresh_check < self.refresh_interval:
+                return False
+        
+        with self._lock:
+            self._last_refresh_check = time.monotonic()
+            if self._compute_data_signature() == self._data_signature:
+                return False
+            
+            print("检测到数据文件变化，重新加载数据")
+            self.reload()
+            return True
+    
+    def reload(self):
+        """清空所有数据缓存并重新加载基本数据，提交记录及其派生表在下次访问时重建"""
+        with self._lock:
+            self._update_data_signature()
+            self._snapshot = None
+            self._aggregate_cube = None
+            self._behavior_histograms = None
+            self._class_row_counts = {}
+            self._load_students_data()
+            self._load_questions_data()
+        self._notify_reload()
+    
     def _load_students_data(self):
         """加载学生信息数据"""
         try:
@@ -40,79 +450,802 @@ class DataService:
             print(f"加载题目数据失败: {e}")
             self._questions_data = pd.DataFrame()
     
-    def _load_submissions_data(self, class_id):
-        """加载指定班级的提交记录数据"""
-        if class_id in self._submissions_data:
-            return
-            
+    def _read_submissions_file(self, class_id):
+        """读取单个班级的提交记录文件（优先使用列式缓存）
+        
+        Returns:
+            (提交记录DataFrame, 耗时秒数)
+        """
+        start = time.perf_counter()
         try:
             file_path = self.data_dir / 'Data_SubmitRecord' / f'SubmitRecord-{class_id}.csv'
-            self._submissions_data[class_id] = pd.read_csv(file_path)
-            print(f"已加载{class_id}的{len(self._submissions_data[class_id])}条提交记录")
+            df = self._submission_cache.load(file_path, reader=read_submission_csv)
         except Exception as e:
             print(f"加载{class_id}提交记录失败: {e}")
-            self._submissions_data[class_id] = pd.DataFrame()
+            df = pd.DataFrame()
+        return df, time.perf_counter() - start
     
-    def get_students(self, filters=None):
-        """获取学生信息，可选过滤条件"""
+    def _load_submissions_data(self, class_ids, questions):
+        """使用线程池并行加载多个班级的提交记录数据
+        
+        pyarrow解析CSV和读取Feather缓存时释放GIL，线程数按CPU核数而非文件数扩展。
+        
+        Returns:
+            与class_ids顺序一致的提交记录DataFrame列表
+        """
+        if not class_ids:
+            return []
+        start = time.perf_counter()
+        workers = max(1, min(self.load_workers, len(class_ids)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='submission-loader') as executor:
+            results = list(executor.map(self._read_submissions_file, class_ids))
+        
+        frames = []
+        for class_id, (df, elapsed) in zip(class_ids, results):
+            if not df.empty and 'Mastery' not in df.columns:
+                # 未经预处理的提交记录现场计算掌握度
+                df['Mastery'] = compute_submission_mastery(df, title_total_scores(questions))
+            frames.append(df)
+            self._load_timings[class_id] = {'rows': len(df), 'seconds': round(elapsed, 4)}
+            print(f"已加载{class_id}的{len(df)}条提交记录，耗时{elapsed * 1000:.1f}ms")
+        print(f"并行加载{len(class_ids)}个提交记录文件完成（{workers}个线程），"
+              f"总耗时{time.perf_counter() - start:.2f}s")
+        return frames
+    
+    @staticmethod
+    def _apply_filters(df, filters):
+        """按列值过滤DataFrame，忽略不存在的列"""
+        if not filters:
+            return df
+        filtered_data = df
+        for key, value in filters.items():
+            if key in df.columns:
+                filtered_data = filtered_data[filtered_data[key] == value]
+        return filtered_data
+    
+    def get_students_df(self, filters=None):
+        """获取学生信息DataFrame，可选过滤条件
+        
+        无过滤条件时直接返回缓存的DataFrame（不复制），调用方不得原地修改。
+        """
+        self.refresh_if_changed()
         if self._students_data is None:
             self._load_students_data()
-            
-        if filters:
-            # 应用过滤条件
-            filtered_data = self._students_data
-            for key, value in filters.items():
-                if key in self._students_data.columns:
-                    filtered_data = filtered_data[filtered_data[key] == value]
-            return filtered_data.to_dict('records')
-        
-        return self._students_data.to_dict('records')
+        return self._apply_filters(self._students_data, filters)
     
-    def get_questions(self, filters=None):
-        """获取题目信息，可选过滤条件"""
+    def get_questions_df(self, filters=None):
+        """获取题目信息DataFrame，可选过滤条件
+        
+        无过滤条件时直接返回缓存的DataFrame（不复制），调用方不得原地修改。
+        """
+        self.refresh_if_changed()
         if self._questions_data is None:
             self._load_questions_data()
+        return self._apply_filters(self._questions_data, filters)
+    
+    def get_submissions_df(self, class_id=None, student_id=None):
+        """获取提交记录DataFrame，可按班级和学生ID过滤
+        
+        Args:
+            class_id: 班级ID，为None时返回所有班级的提交记录
+            student_id: 学生ID，为None时不按学生过滤
+        """
+        # 各班级数据为合并后紧凑表的行区间（追加记录后可能有多个区间），共享同一套词表
+        snapshot = self._get_snapshot()
+        submissions = snapshot.submissions
+        
+        rows = None
+        if student_id:
+            rows = snapshot.student_rows(student_id)
+        
+        if class_id is not None:
+            ranges = snapshot.class_ranges.get(class_id)
+            if not ranges:
+                return submissions.iloc[0:0]
+            if rows is None:
+                if len(ranges) == 1:
+                    start, stop = ranges[0]
+                    return submissions.iloc[start:stop]
+                rows = snapshot.file_rows(class_id)
+            else:
+                rows = rows[snapshot.in_file(rows, class_id)]
+        
+        if rows is None:
+            return submissions
+        return submissions.take(rows)
+    
+    def get_all_submissions_df(self):
+        """获取所有班级合并后的提交记录DataFrame（按需加载）
+        
+        合并结果只构建一次并在进程内共享，返回的DataFrame不复制，调用方不得原地修改。
+        """
+        return self._get_snapshot().submissions
+    
+    def _get_snapshot(self):
+        """获取当前的提交记录快照（按需构建）
+        
+        调用方在一次调用内只使用同一个快照，不混用不同时刻的表、索引和数据版本。
+        """
+        self.refresh_if_changed()
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+        
+        with self._lock:
+            if self._snapshot is None:
+                self._snapshot = self._build_snapshot()
+            return self._snapshot
+    
+    def _build_snapshot(self):
+        """由数据文件构建提交记录快照（调用时持有_lock）"""
+        questions = self.get_questions_df()
+        
+        # 并行加载所有班级数据
+        class_ids = self.get_class_ids()
+        all_submissions = self._load_submissions_data(class_ids, questions)
+        
+        # 合并所有数据（逐列直接拼接为紧凑表示，不经过中间的整表concat）
+        combined, vocabularies = self._compact_submissions(all_submissions)
+        
+        # 各班级数据为合并表中的行区间，避免同一份数据在内存中保存两次
+        class_ranges = {}
+        start = 0
+        for class_id, df in zip(class_ids, all_submissions):
+            stop = start + len(df)
+            if not df.empty:
+                class_ranges[class_id] = [(start, stop)]
+            start = stop
+        
+        return SubmissionSnapshot(self.data_version, combined, vocabularies, class_ranges, questions)
+    
+    def get_student_rows(self, student_id):
+        """获取学生在合并表中的升序行号"""
+        return self._get_snapshot().student_rows(student_id)
+    
+    def get_title_rows(self, title_id):
+        """获取题目在合并表中的升序行号"""
+        return self._get_snapshot().title_rows(title_id)
+    
+    def get_class_submissions(self, class_id, columns=None):
+        """按提交记录的class列获取班级的提交（与预聚合立方体的班级维度一致）
+        
+        行号由class列的倒排索引定位，不扫描整个合并表。
+        
+        Args:
+            class_id: 班级ID
+            columns: 需要的列，为None时返回全部列
+        """
+        snapshot = self._get_snapshot()
+        submissions = snapshot.submissions
+        if columns is not None and not submissions.empty:
+            submissions = submissions[columns]
+        return submissions.take(snapshot.class_rows(class_id))
+    
+    def get_knowledge_rows(self, knowledge=None, sub_knowledge=None):
+        """获取知识点或从属知识点相关提交在合并表中的升序行号
+        
+        Args:
+            knowledge: 知识点
+            sub_knowledge: 从属知识点，与knowledge同时指定时取交集
+        """
+        return self._get_snapshot().knowledge_rows(knowledge, sub_knowledge)
+    
+    def select_submission_rows(self, class_id=None, student_id=None, title_id=None, state=None,
+                               knowledge=None, sub_knowledge=None, start_time=None, end_time=None):
+        """按条件筛选提交记录，返回合并表中的升序行号
+        
+        学生、题目和知识点条件通过倒排索引取行号后求交集，班级取合并表中的行区间，
+        状态按分类编码、时间按时间戳只在候选行上比较，不物化中间DataFrame。
+        
+        Args:
+            class_id: 班级ID（提交记录文件）
+            student_id: 学生ID
+            title_id: 题目ID
+            state: 答题状态
+            knowledge: 知识点
+            sub_knowledge: 从属知识点
+            start_time: 起始Unix时间戳（包含）
+            end_time: 结束Unix时间戳（包含）
+        """
+        return self._get_snapshot().select_rows(
+            class_id=class_id, student_id=student_id, title_id=title_id, state=state, knowledge=knowledge,
+            sub_knowledge=sub_knowledge, start_time=start_time, end_time=end_time)
+    
+    def get_submission_page(self, filters=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """按游标分页获取筛选后的提交记录
+        
+        游标为上一页最后一条记录的行号及数据版本，数据变化后旧游标失效。
+        合并表、筛选行号和游标版本取自同一个快照。
+        
+        Args:
+            filters: select_submission_rows的筛选条件字典
+            cursor: 上一页返回的next_cursor，为None时从头开始
+            limit: 每页记录数，不超过MAX_PAGE_SIZE
+        
+        Returns:
+            包含records、next_cursor（没有更多记录时为None）和total的字典
+        """
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            return {'status': 'error', 'message': f'limit必须在1到{MAX_PAGE_SIZE}之间'}
+        
+        snapshot = self._get_snapshot()
+        version = snapshot.version
+        after = -1
+        if cursor:
+            cursor_version, _, position = cursor.partition(':')
+            if cursor_version != version or not position.isdigit():
+                return {'status': 'error', 'message': '游标无效或数据已更新，请重新开始分页'}
+            after = int(position)
+        
+        rows = snapshot.select_rows(**(filters or {}))
+        start = int(np.searchsorted(rows, after, side='right'))
+        page_rows = rows[start:start + limit]
+        has_more = start + limit < len(rows)
+        return {
+            'status': 'success',
+            'records': self.to_records(snapshot.submissions.take(page_rows)),
+            'limit': limit,
+            'total': len(rows),
+            'next_cursor': f'{version}:{page_rows[-1]}' if has_more else None
+        }
+    
+    def iter_submission_frames(self, filters=None, batch_size=STREAM_BATCH_SIZE):
+        """分批生成筛选后的提交记录DataFrame（合并表的行切片），内存占用与结果总数无关
+        
+        Args:
+            filters: select_submission_rows的筛选条件字典
+            batch_size: 每批的行数
+        """
+        snapshot = self._get_snapshot()
+        rows = snapshot.select_rows(**(filters or {}))
+        for start in range(0, len(rows), batch_size):
+            yield snapshot.submissions.take(rows[start:start + batch_size])
+    
+    def iter_submission_batches(self, filters=None, batch_size=STREAM_BATCH_SIZE):
+        """分批生成筛选后的提交记录，每次只转换batch_size行，内存占用与结果总数无关
+        
+        Args:
+            filters: select_submission_rows的筛选条件字典
+            batch_size: 每批转换的行数
             
-        if filters:
-            # 应用过滤条件
-            filtered_data = self._questions_data
-            for key, value in filters.items():
-                if key in self._questions_data.columns:
-                    filtered_data = filtered_data[filtered_data[key] == value]
-            return filtered_data.to_dict('records')
+        Yields:
+            提交记录字典列表
+        """
+        for frame in self.iter_submission_frames(filters, batch_size):
+            yield self.to_records(frame)
+    
+    def _compact_submissions(self, frames):
+        """将各班级的提交记录合并并转换为紧凑表示
+        
+        逐列转换后直接拼接，每列只复制一次。ID和状态等重复字符串列转换为基于共享词表的
+        Categorical（int32编码），数值列降精度存储，timeconsume中的"--"、"-"等非数值转为NaN。
+        
+        Args:
+            frames: 按班级顺序排列的提交记录DataFrame列表
+        
+        Returns:
+            (合并后的DataFrame, 分类列名 -> 共享词表)
+        """
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return pd.DataFrame(), {}
         
-        return self._questions_data.to_dict('records')
+        columns = list(dict.fromkeys(column for df in frames for column in df.columns))
+        compact = {}
+        vocabularies = {}
+        for column in columns:
+            parts = [df[column] if column in df.columns else pd.Series(np.nan, index=df.index)
+                     for df in frames]
+            if column in CATEGORICAL_COLUMNS:
+                vocabulary = vocabularies[column] = self._build_vocabulary(column, parts)
+                codes = np.concatenate([vocabulary.get_indexer(part) for part in parts]).astype(np.int32)
+                compact[column] = pd.Categorical.from_codes(codes, categories=vocabulary)
+            else:
+                compact[column] = self._compact_values(column, parts)
+        return pd.DataFrame(compact), vocabularies
     
-    def get_submissions(self, class_id='Class1', student_id=None):
-        """获取提交记录，可按班级和学生ID过滤"""
-        if class_id not in self._submissions_data:
-            self._load_submissions_data(class_id)
+    def _compact_values(self, column, parts):
+        """将非分类列的各部分转换为紧凑类型后拼接"""
+        if column in ('index', 'score', 'memory'):
+            return self._downcast_integer(
+                np.concatenate([pd.to_numeric(part, errors='coerce').to_numpy() for part in parts]))
+        if column == 'timeconsume':
+            return np.concatenate([
+                part.to_numpy(np.float32) if pd.api.types.is_numeric_dtype(part) else
+                pd.to_numeric(part.replace(['--', '-'], np.nan), errors='coerce').to_numpy(np.float32)
+                for part in parts])
+        if column == 'time':
+            values = np.concatenate([part.to_numpy() for part in parts])
+            return values if np.isnan(values.astype(np.float64)).any() else values.astype(np.int64)
+        return pd.concat(parts, ignore_index=True)
+    
+    def _extend_submissions(self, submissions, vocabularies, batch):
+        """在紧凑合并表末尾接上一批新提交记录
+        
+        分类列只对新记录查词表编码，新记录带来词表中没有的取值时按新的有序词表重映射旧编码；
+        其余列与_compact_submissions使用相同的类型转换。
+        
+        Args:
+            submissions: 已有的紧凑合并表
+            vocabularies: 已有合并表的共享词表
+            batch: 新提交记录（_normalize_submissions的结果）
+        
+        Returns:
+            (新的合并表, 新的共享词表)
+        """
+        columns = list(dict.fromkeys(list(submissions.columns) + list(batch.columns)))
+        compact = {}
+        extended_vocabularies = dict(vocabularies)
+        for column in columns:
+            old = (submissions[column] if column in submissions.columns
+                   else pd.Series(np.nan, index=submissions.index))
+            new = batch[column] if column in batch.columns else pd.Series(np.nan, index=batch.index)
+            if column in CATEGORICAL_COLUMNS and isinstance(old.dtype, pd.CategoricalDtype):
+                vocabulary = old.cat.categories
+                old_codes = old.cat.codes.to_numpy()
+                labels = pd.Index(new.dropna().unique(), dtype=object)
+                if (vocabulary.get_indexer(labels) < 0).any():
+                    extended = pd.Index(sorted(set(vocabulary).union(labels)), dtype=object)
+                    mapping = extended.get_indexer(vocabulary).astype(np.int32)
+                    old_codes = np.where(old_codes >= 0, mapping[old_codes], -1)
+                    vocabulary = extended
+                codes = np.concatenate([old_codes, vocabulary.get_indexer(new)]).astype(np.int32)
+                compact[column] = pd.Categorical.from_codes(codes, categories=vocabulary)
+                extended_vocabularies[column] = vocabulary
+            else:
+                compact[column] = self._compact_values(column, [old, new])
+        return pd.DataFrame(compact), extended_vocabularies
+    
+    @staticmethod
+    def _downcast_integer(values):
+        """整数列转为int32，含缺失值时转为float32"""
+        if values.dtype.kind == 'f' and np.isnan(values).any():
+            return values.astype(np.float32)
+        return values.astype(np.int32)
+    
+    def _build_vocabulary(self, column, parts):
+        """构建分类列的共享词表（有序且包含学生/题目信息表中的全部ID）"""
+        labels = set().union(*(part.dropna().unique() for part in parts))
+        if column == 'student_ID':
+            labels.update(self.get_students_df().get('student_ID', pd.Series(dtype=object)).dropna())
+        elif column == 'title_ID':
+            labels.update(self.get_questions_df().get('title_ID', pd.Series(dtype=object)).dropna())
+        return pd.Index(sorted(labels), dtype=object)
+    
+    def get_vocabulary(self, column):
+        """获取分类列的共享词表"""
+        return self._get_snapshot().vocabulary(column)
+    
+    def encode(self, column, values):
+        """将ID等取值编码为词表中的int32编码，未知取值编码为-1
+        
+        Args:
+            column: 分类列名，如'student_ID'
+            values: 单个取值或取值列表
+        """
+        return self._get_snapshot().encode(column, values)
+    
+    def decode(self, column, codes):
+        """将int32编码还原为原始取值，-1还原为None"""
+        vocabulary = self.get_vocabulary(column)
+        if np.isscalar(codes):
+            return vocabulary[codes] if 0 <= codes < len(vocabulary) else None
+        codes = np.asarray(codes)
+        labels = np.full(codes.shape, None, dtype=object)
+        valid = (codes >= 0) & (codes < len(vocabulary))
+        labels[valid] = np.asarray(vocabulary, dtype=object)[codes[valid]]
+        return labels
+    
+    @staticmethod
+    def to_records(df):
+        """将紧凑格式的DataFrame转换为可JSON序列化的记录列表
+        
+        分类列还原为字符串，缺失值转换为None。
+        """
+        if df.empty:
+            return []
+        df = df.astype(object)
+        return df.where(df.notna(), None).to_dict('records')
+    
+    def get_fact_table(self, student_id=None):
+        """获取提交记录事实表
+        
+        事实表由提交记录与题目信息按title_ID左连接而成，并预先完成清洗：
+        knowledge/sub_knowledge缺失填充为'未知'，timeconsume为数值，附带题目满分
+        max_score，以及北京时间的datetime、hour、weekday、date列。
+        同一题目属于多个知识点时一条提交对应多行：前len(提交记录)行与提交记录
+        逐行对应（关联第一条题目信息），其后为多知识点题目的附加行。
+        
+        事实表只在数据变化后重建，返回的DataFrame不复制，调用方不得原地修改。
+        
+        Args:
+            student_id: 学生ID，指定时只返回该学生的事实行
+        """
+        snapshot = self._get_snapshot()
+        fact, student_index = self._get_fact_state(snapshot)
+        if not student_id:
+            return fact
+        if student_index is None:
+            return fact.iloc[0:0]
+        return fact.take(student_index.get(snapshot.encode('student_ID', student_id)))
+    
+    def get_student_fact_tables(self, student_ids):
+        """批量获取多个学生的事实行，所有学生的行号拼接后只做一次take
+        
+        Args:
+            student_ids: 学生ID列表
+        
+        Returns:
+            学生ID -> 该学生事实行的DataFrame（与get_fact_table(student_id)一致），不存在的学生为空表
+        """
+        snapshot = self._get_snapshot()
+        fact, student_index = self._get_fact_state(snapshot)
+        if student_index is None:
+            return {student_id: fact.iloc[0:0] for student_id in student_ids}
+        rows = [student_index.get(snapshot.encode('student_ID', student_id)) for student_id in student_ids]
+        facts = fact.take(np.concatenate(rows)) if rows else fact.iloc[0:0]
+        bounds = np.concatenate([[0], np.cumsum([len(student_rows) for student_rows in rows])])
+        return {student_id: facts.iloc[bounds[i]:bounds[i + 1]] for i, student_id in enumerate(student_ids)}
+    
+    def get_submission_facts(self, student_id=None):
+        """获取每条提交一行的事实表视图（事实表的前len(提交记录)行）
+        
+        Args:
+            student_id: 学生ID，指定时只返回该学生的提交
+        """
+        snapshot = self._get_snapshot()
+        fact, _ = self._get_fact_state(snapshot)
+        submission_facts = fact.iloc[:len(snapshot.submissions)]
+        if not student_id:
+            return submission_facts
+        return submission_facts.take(snapshot.student_rows(student_id))
+    
+    def _get_fact_state(self, snapshot):
+        """获取快照的事实表及其学生索引（按需构建）
+        
+        事实表在持有_lock时由同一快照的合并表和题目信息构建，构建成功后
+        与学生索引一起发布到快照上，构建失败时不发布任何部分结果。
+        """
+        state = snapshot.fact_state
+        if state is not None:
+            return state
+        with self._lock:
+            if snapshot.fact_state is None:
+                fact = self._build_fact_table(snapshot.submissions, snapshot.questions)
+                student_index = None
+                if not fact.empty:
+                    student_index = RowIndex(fact['student_ID'].cat.codes.to_numpy(),
+                                             len(snapshot.vocabulary('student_ID')))
+                snapshot.fact_state = (fact, student_index)
+            return snapshot.fact_state
+    
+    def _extend_fact_state(self, previous, snapshot):
+        """在追加前快照的事实表上接入新记录的事实行，发布到追加后的快照（调用时持有_lock）
+        
+        新记录的事实行由追加后合并表的末尾行构建：逐提交行接在已有的逐提交行之后，
+        多知识点题目的附加行接在最后，保持前len(提交记录)行与提交记录逐行对应。
+        追加前的事实表尚未构建时不处理，追加后的事实表在首次访问时构建。
+        """
+        state = previous.fact_state
+        if state is None or state[0].empty:
+            return
+        fact = state[0]
+        start = len(previous.submissions)
+        count = len(snapshot.submissions) - start
+        delta = self._build_fact_table(snapshot.submissions.iloc[start:], snapshot.questions)
+        if delta.empty:
+            return
+        delta['submission_row'] += start
+        
+        # 各部分的分类列按有序的合并取值拼接（新记录可能带来新的ID或知识点）
+        parts = [fact.iloc[:start], delta.iloc[:count], fact.iloc[start:], delta.iloc[count:]]
+        columns = {}
+        for column in fact.columns:
+            pieces = [part[column] for part in parts]
+            if isinstance(fact[column].dtype, pd.CategoricalDtype):
+                columns[column] = union_categoricals(pieces, sort_categories=True)
+            else:
+                columns[column] = pd.concat(pieces, ignore_index=True)
+        fact = pd.DataFrame(columns)
+        student_index = RowIndex(fact['student_ID'].cat.codes.to_numpy(), len(snapshot.vocabulary('student_ID')))
+        snapshot.fact_state = (fact, student_index)
+    
+    def get_aggregate_cube(self):
+        """获取提交记录的预聚合立方体
+        
+        优先读取Data/Cache中与当前数据版本一致的持久化立方体（无需加载提交记录），
+        否则由事实表构建并持久化。
         
-        submissions = self._submissions_data.get(class_id, pd.DataFrame())
+        Returns:
+            AggregateCube实例
+        """
+        self.refresh_if_changed()
+        if self._aggregate_cube is not None:
+            return self._aggregate_cube
         
-        if student_id and not submissions.empty:
-            submissions = submissions[submissions['student_ID'] == student_id]
+        with self._lock:
+            if self._aggregate_cube is not None:
+                return self._aggregate_cube
+            
+            cache_dir = self.data_dir / 'Cache'
+            cube = AggregateCube.load(cache_dir, self.data_version)
+            if cube is None:
+                snapshot = self._get_snapshot()
+                fact, _ = self._get_fact_state(snapshot)
+                cube = AggregateCube.build(fact, len(snapshot.submissions))
+                if not cube.empty:
+                    cube.save(cache_dir, snapshot.version)
+            self._aggregate_cube = cube
+            return self._aggregate_cube
+    
+    def get_behavior_histograms(self):
+        """获取按学生预计算的行为直方图（提交时段、星期、状态和方法）
+        
+        优先读取Data/Cache中与当前数据版本一致的持久化直方图，否则由提交记录构建并持久化。
+        
+        Returns:
+            BehaviorHistograms实例
+        """
+        self.refresh_if_changed()
+        if self._behavior_histograms is not None:
+            return self._behavior_histograms
+        
+        with self._lock:
+            if self._behavior_histograms is not None:
+                return self._behavior_histograms
+            
+            cache_dir = self.data_dir / 'Cache'
+            histograms = BehaviorHistograms.load(cache_dir, self.data_version)
+            if histograms is None:
+                snapshot = self._get_snapshot()
+                histograms = BehaviorHistograms.build(snapshot.submissions)
+                if not histograms.empty:
+                    histograms.save(cache_dir, snapshot.version)
+            self._behavior_histograms = histograms
+            return self._behavior_histograms
+    
+    def append_submissions(self, records):
+        """追加新的提交记录
+        
+        新记录计算Mastery后追加写入对应班级的SubmitRecord文件，不重新读取数据文件：
+        已加载的预聚合立方体和行为直方图由新记录构建增量后合并；提交记录快照的合并表末尾
+        接上新记录，行号索引和已构建的事实表只追加新行，得到新快照。更新完成后整体替换
+        这些对象并更新数据版本，并发读者看到的始终是更新前或更新后的一致数据，
+        已取得旧快照的读者继续使用旧快照。
+        
+        Args:
+            records: 提交记录字典列表，需包含class、time、state、score、title_ID、method、
+                     memory、timeconsume、student_ID字段
+            
+        Returns:
+            追加结果，包含追加条数和新的数据版本
+        """
+        if not records:
+            return {'status': 'error', 'message': '提交记录不能为空'}
+        try:
+            batch = pd.DataFrame.from_records(records)
+        except Exception as e:
+            return {'status': 'error', 'message': f'提交记录格式错误: {e}'}
+        
+        missing = [field for field in SUBMISSION_FIELDS if field not in batch.columns]
+        if missing:
+            return {'status': 'error', 'message': f'提交记录缺少字段: {", ".join(missing)}'}
+        batch = batch[SUBMISSION_FIELDS].copy()
+        if batch[['class', 'student_ID', 'title_ID', 'state']].isna().any().any():
+            return {'status': 'error', 'message': 'class、student_ID、title_ID和state不能为空'}
+        batch['class'] = batch['class'].astype(str)
+        invalid_classes = sorted(set(batch.loc[~batch['class'].str.match(CLASS_ID_PATTERN), 'class']))
+        if invalid_classes:
+            return {'status': 'error', 'message': f'无效的班级ID: {", ".join(invalid_classes)}'}
+        batch['time'] = pd.to_numeric(batch['time'], errors='coerce')
+        if batch['time'].isna().any():
+            return {'status': 'error', 'message': 'time必须为Unix时间戳'}
+        
+        # 同一班级的新记录排在一起（与写入班级文件的顺序一致），接在合并表末尾时各占一个行区间
+        batch = batch.iloc[np.argsort(batch['class'].factorize()[0], kind='stable')].reset_index(drop=True)
+        
+        with self._lock:
+            # 增量更新以当前加载的数据为基础，先确认数据文件没有被外部修改
+            self.refresh_if_changed(force=True)
+            start = time.perf_counter()
+            batch['Mastery'] = compute_submission_mastery(batch, title_total_scores(self.get_questions_df()))
+            
+            # 先追加写入班级文件，保证之后按文件重建的数据包含新记录
+            file_indexes = [self._append_class_file(class_id, rows)
+                            for class_id, rows in batch.groupby('class', sort=False)]
+            batch['index'] = np.concatenate(file_indexes)
+            
+            # 由新记录构建增量立方体和直方图并合并（未加载时下次访问再按文件构建）
+            normalized = self._normalize_submissions(batch)
+            cube = self._aggregate_cube
+            if cube is not None:
+                delta = AggregateCube.build(self._build_fact_table(normalized), len(normalized))
+                cube = cube.append(delta)
+            histograms = self._behavior_histograms
+            if histograms is not None:
+                histograms = histograms.merge(BehaviorHistograms.build(normalized))
+            
+            # 自身写入不触发自动重新加载；提交记录快照在旧快照上追加新记录（未加载时下次访问按文件构建）
+            self._update_data_signature()
+            snapshot = self._snapshot
+            if snapshot is not None:
+                snapshot = self._append_to_snapshot(snapshot, normalized)
+            self._snapshot = snapshot
+            self._aggregate_cube = cube
+            self._behavior_histograms = histograms
+            elapsed = time.perf_counter() - start
+        self._notify_reload()
+        
+        print(f"已追加{len(batch)}条提交记录，耗时{elapsed * 1000:.1f}ms")
+        return {
+            'status': 'success',
+            'appended': len(batch),
+            'data_version': self.data_version
+        }
+    
+    def _append_to_snapshot(self, snapshot, batch):
+        """由追加前的快照和新记录构建追加后的快照（调用时持有_lock）
+        
+        新记录接在合并表末尾，每个班级的新记录形成该班级的一个新行区间；行号索引和已构建的
+        事实表在旧快照的基础上追加新行。旧快照不修改，已取得它的读者不受影响。
+        
+        Args:
+            snapshot: 追加前的快照
+            batch: 按班级排列的新提交记录（_normalize_submissions的结果）
+        
+        Returns:
+            追加后的快照，旧快照为空表时返回None（下次访问按文件构建）
+        """
+        start = len(snapshot.submissions)
+        if start == 0:
+            return None
+        submissions, vocabularies = self._extend_submissions(snapshot.submissions, snapshot.vocabularies, batch)
+        
+        class_ranges = {class_id: list(ranges) for class_id, ranges in snapshot.class_ranges.items()}
+        stop = start
+        for class_id, count in batch.groupby('class', sort=False).size().items():
+            class_ranges.setdefault(class_id, []).append((stop, stop + count))
+            stop += count
+        
+        extended = SubmissionSnapshot(self.data_version, submissions, vocabularies, class_ranges,
+                                      snapshot.questions, previous=snapshot)
+        self._extend_fact_state(snapshot, extended)
+        return extended
+    
+    def _append_class_file(self, class_id, rows):
+        """将提交记录追加写入班级文件，列顺序与文件表头一致，index接续已有记录编号
         
-        return submissions.to_dict('records')
+        Returns:
+            写入记录的index编号数组
+        """
+        file_path = self.data_dir / 'Data_SubmitRecord' / f'SubmitRecord-{class_id}.csv'
+        write_header = not file_path.exists()
+        if not write_header:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                header = f.readline().strip().split(',')
+            if class_id not in self._class_row_counts:
+                self._class_row_counts[class_id] = self._count_file_rows(file_path)
+        else:
+            header = ['index'] + SUBMISSION_FIELDS + ['Mastery']
+            self._class_row_counts[class_id] = 0
+        
+        existing = self._class_row_counts[class_id]
+        rows = rows.assign(index=np.arange(existing, existing + len(rows)),
+                           time=rows['time'].astype(np.float64))
+        rows.reindex(columns=header).to_csv(file_path, mode='a', header=write_header, index=False)
+        self._class_row_counts[class_id] = existing + len(rows)
+        return rows['index'].to_numpy()
+    
+    @staticmethod
+    def _count_file_rows(file_path):
+        """统计CSV文件的数据行数，并确保文件以换行结尾以便追加"""
+        line_count = 0
+        last_byte = b'\n'
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                line_count += chunk.count(b'\n')
+                last_byte = chunk[-1:]
+        if last_byte != b'\n':
+            with open(file_path, 'ab') as f:
+                f.write(b'\n')
+            line_count += 1
+        return max(line_count - 1, 0)
+    
+    @staticmethod
+    def _normalize_submissions(submissions):
+        """将新提交记录的数值列转换为与合并表一致的类型"""
+        normalized = submissions.copy()
+        normalized['time'] = submissions['time'].astype(np.int64)
+        normalized['score'] = pd.to_numeric(submissions['score'], errors='coerce')
+        normalized['memory'] = pd.to_numeric(submissions['memory'], errors='coerce')
+        normalized['timeconsume'] = pd.to_numeric(submissions['timeconsume'].replace(['--', '-'], np.nan),
+                                                  errors='coerce')
+        return normalized
+    
+    def _build_fact_table(self, submissions, questions=None):
+        """构建提交记录事实表
+        
+        Args:
+            submissions: 紧凑格式的提交记录
+            questions: 题目信息，为None时使用当前加载的题目信息
+        """
+        if questions is None:
+            questions = self.get_questions_df()
+        if submissions.empty or questions.empty:
+            return pd.DataFrame()
+        
+        start = time.perf_counter()
+        
+        # 题目信息的title_ID使用与提交记录相同的词表，按分类编码连接
+        title_dtype = submissions['title_ID'].dtype
+        question_info = questions[['title_ID', 'knowledge', 'sub_knowledge']].copy()
+        question_info['title_ID'] = question_info['title_ID'].astype(title_dtype)
+        max_scores = questions.groupby('title_ID')['score'].max()
+        
+        merged = submissions.assign(submission_row=np.arange(len(submissions), dtype=np.int32))
+        merged = pd.merge(merged, question_info, on='title_ID', how='left')
+        
+        # 每条提交的第一条关联行排在前面，使前len(submissions)行与提交记录逐行对应
+        primary = ~merged['submission_row'].duplicated()
+        fact = pd.concat([merged[primary], merged[~primary]], ignore_index=True)
+        
+        fact['knowledge'] = fact['knowledge'].fillna('未知').astype('category')
+        fact['sub_knowledge'] = fact['sub_knowledge'].fillna('未知').astype('category')
+        fact['max_score'] = fact['title_ID'].astype(object).map(max_scores).astype(np.float32)
+        
+        # 时间戳转换为北京时间（UTC+8）并提取时间特征
+        fact['datetime'] = pd.to_datetime(fact['time'], unit='s', utc=True).dt.tz_convert('Asia/Shanghai')
+        fact['hour'] = fact['datetime'].dt.hour.astype(np.int8)
+        fact['weekday'] = fact['datetime'].dt.weekday.astype(np.int8)
+        fact['date'] = fact['datetime'].dt.tz_localize(None).dt.normalize()
+        
+        print(f"已构建{len(fact)}行提交记录事实表，耗时{time.perf_counter() - start:.2f}s")
+        return fact
+    
+    def get_students(self, filters=None):
+        """获取学生信息，可选过滤条件"""
+        return self.get_students_df(filters).to_dict('records')
     
-    def get_all_submissions(self):
-        """获取所有班级的提交记录（按需加载）"""
-        # 获取所有班级文件名
+    def get_questions(self, filters=None):
+        """获取题目信息，可选过滤条件"""
+        return self.get_questions_df(filters).to_dict('records')
+    
+    def get_submissions(self, class_id='Class1', student_id=None):
+        """获取提交记录，可按班级和学生ID过滤"""
+        return self.to_records(self.get_submissions_df(class_id, student_id))
+    
+    def get_class_ids(self):
+        """获取所有班级ID（根据提交记录文件名）"""
         submit_dir = self.data_dir / 'Data_SubmitRecord'
         class_files = [f.name for f in submit_dir.glob('SubmitRecord-*.csv')]
-        class_ids = [f.split('-')[1].split('.')[0] for f in class_files]
+        return [f.split('-')[1].split('.')[0] for f in class_files]
+    
+    def get_all_submissions(self, page=1, page_size=DEFAULT_PAGE_SIZE):
+        """分页获取所有班级的提交记录（按合并表的行顺序）
         
-        # 加载所有班级数据
-        all_submissions = []
-        for class_id in class_ids:
-            if class_id not in self._submissions_data:
-                self._load_submissions_data(class_id)
-            all_submissions.append(self._submissions_data.get(class_id, pd.DataFrame()))
+        Args:
+            page: 页码，从1开始
+            page_size: 每页记录数，不超过MAX_PAGE_SIZE
+            
+        Returns:
+            包含records及page、page_size、total、total_pages分页信息的字典
+        """
+        if page < 1:
+            return {'status': 'error', 'message': 'page必须为正整数'}
+        if not 1 <= page_size <= MAX_PAGE_SIZE:
+            return {'status': 'error', 'message': f'page_size必须在1到{MAX_PAGE_SIZE}之间'}
         
-        # 合并所有数据
-        if all_submissions:
-            return pd.concat(all_submissions).to_dict('records')
-        return []
+        submissions = self.get_all_submissions_df()
+        total = len(submissions)
+        start = (page - 1) * page_size
+        return {
+            'status': 'success',
+            'page': page,
+            'page_size': page_size,
+            'total': total,
+            'total_pages': (total + page_size - 1) // page_size,
+            'records': self.to_records(submissions.iloc[start:start + page_size])
+        }
     
     def get_knowledge_structure(self):
         """获取知识点结构"""
@@ -134,4 +1267,41 @@ class DataService:
             if sub_knowledge not in knowledge_structure[main_knowledge]:
                 knowledge_structure[main_knowledge].append(sub_knowledge)
         
-        return knowledge_structure
\ No newline at end of file
+        return knowledge_structure
+    
+    def get_memory_usage(self):
+        """获取数据缓存的内存占用情况
+        
+        Returns:
+            各数据表占用的字节数，以及已加载的班级和总计
+        """
+        def frame_bytes(df):
+            if df is None or df.empty:
+                return 0
+            return int(df.memory_usage(deep=True).sum())
+        
+        with self._lock:
+            snapshot = self._snapshot
+            submissions = {}
+            submissions_total = 0
+            fact_state = None
+            if snapshot is not None:
+                submissions = {class_id: sum(frame_bytes(snapshot.submissions.iloc[start:stop])
+                                             for start, stop in ranges)
+                               for class_id, ranges in snapshot.class_ranges.items()}
+                # 各班级数据只是合并表的行区间，总计只统计合并表
+                submissions_total = frame_bytes(snapshot.submissions)
+                fact_state = snapshot.fact_state
+            usage = {
+                'students': frame_bytes(self._students_data),
+                'questions': frame_bytes(self._questions_data),
+                'submissions': submissions,
+            }
+            usage['fact_table'] = frame_bytes(fact_state[0] if fact_state is not None else None)
+            usage['aggregate_cube'] = self._aggregate_cube.memory_usage() if self._aggregate_cube is not None else 0
+            usage['behavior_histograms'] = (self._behavior_histograms.memory_usage()
+                                            if self._behavior_histograms is not None else 0)
+            usage['load_timings'] = dict(self._load_timings)
+        usage['total'] = (usage['students'] + usage['questions'] + submissions_total
+                          + usage['fact_table'] + usage['aggregate_cube'] + usage['behavior_histograms'])
+        return usage
@@ -0,0 +1,111 @@
+# JSON序列化模块 - Flask的JSON提供器，直接序列化numpy、pandas类型，NaN输出为null
+
+import json
+import math
+import numpy as np
+import pandas as pd
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    # 未安装orjson时使用标准库json
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def _default(obj):
+    """序列化JSON不直接支持的对象：numpy标量和数组、pandas时间戳和缺失值"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, pd.Series):
+        return obj.tolist()
+    if obj is pd.NA:
+        return None
+    return DefaultJSONProvider.default(obj)
+
+
+def _replace_nan(obj):
+    """将嵌套结构中的NaN和无穷大替换为None（仅用于标准库json）"""
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return {key: _replace_nan(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_replace_nan(value) for value in obj]
+    if isinstance(obj, (np.ndarray, np.generic, pd.Series)):
+        return _replace_nan(_default(obj))
+    return obj
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """基于orjson的JSON提供器
+
+    numpy标量和数组由orjson直接序列化，NaN和无穷大输出为null，pandas时间戳输出为
+    ISO格式字符串。与默认提供器一样按键排序，中文不转义。未安装orjson或对象包含
+    orjson不支持的键类型时使用标准库json。
+    """
+
+    ensure_ascii = False
+
+    def _orjson_options(self, kwargs):
+        options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            options |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def _dumps_bytes(self, obj, **kwargs):
+        if ORJSON_AVAILABLE:
+            try:
+                return orjson.dumps(obj, default=_default, option=self._orjson_options(kwargs))
+            except TypeError:
+                pass
+        return self._dumps_json(obj, **kwargs).encode('utf-8')
+
+    def _dumps_json(self, obj, **kwargs):
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        if not kwargs.get('indent'):
+            kwargs.setdefault('separators', (',', ':'))
+        try:
+            return json.dumps(obj, allow_nan=False, **kwargs)
+        except ValueError:
+            # 包含NaN或无穷大时先替换为None
+            return json.dumps(_replace_nan(obj), allow_nan=False, **kwargs)
+
+    def dumps(self, obj, **kwargs):
+        """
+        将对象序列化为JSON字符串
+
+        Args:
+            obj: 要序列化的对象
+            kwargs: sort_keys、indent等参数（orjson只支持2空格缩进）
+
+        Returns:
+            JSON字符串
+        """
+        return self._dumps_bytes(obj, **kwargs).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        """解析JSON字符串或字节"""
+        if ORJSON_AVAILABLE and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        """序列化为JSON响应，响应体直接使用序列化得到的字节"""
+        obj = self._prepare_response_obj(args, kwargs)
+        dump_args = {}
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            dump_args['indent'] = 2
+        return self._app.response_class(self._dumps_bytes(obj, **dump_args) + b'\n', mimetype=self.mimetype)
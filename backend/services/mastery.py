@@ -0,0 +1,185 @@
+# 掌握度计算模块 - 分段计算学生对题目的掌握程度（标量版本与向量化版本）
+
+import time
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# 状态分类编码
+_OTHER, _ABSOLUTELY_CORRECT, _PARTIALLY_CORRECT, _ERROR = 0, 1, 2, 3
+
+
+def calculate_mastery(state, score, total_score):
+    """
+    根据分段计算法计算学生对题目的掌握程度
+    
+    Args:
+        state: 答题状态
+        score: 获得分数
+        total_score: 题目总分
+    
+    Returns:
+        掌握程度值 (0.0-1.0)
+    """
+    # 处理缺失值和异常值
+    if pd.isna(state) or pd.isna(score) or pd.isna(total_score):
+        return 0.0
+    
+    # 确保分数为数值类型
+    try:
+        score = float(score)
+        total_score = float(total_score)
+    except (ValueError, TypeError):
+        return 0.0
+    
+    # 计算分数占比
+    score_ratio = score / total_score if total_score > 0 else 0.0
+    
+    # 处理状态字符串，去除可能的空格和转换为字符串
+    state = str(state).strip()
+    
+    # 分段计算掌握程度
+    if state == "Absolutely_Correct":
+        return 1.0
+    elif state == "Partially_Correct":
+        return score_ratio
+    elif state.startswith("Error") and state != "Absolutely_Error":
+        # Error1, Error2, ..., Error9
+        return 0.1 + 0.2 * score_ratio
+    else:  # Absolutely_Error 或其他未知状态
+        return 0.0
+
+
+def _to_float(values):
+    """转换为float64数组，无法转换的值为NaN"""
+    return pd.to_numeric(pd.Series(values).reset_index(drop=True), errors='coerce').to_numpy(np.float64)
+
+
+def compute_mastery(state, score, total_score):
+    """
+    向量化计算掌握程度，规则与calculate_mastery逐行计算的结果完全一致
+    
+    状态字符串只对去重后的取值分类一次，再按编码展开到每一行。
+    
+    Args:
+        state: 答题状态序列（支持object或Categorical）
+        score: 获得分数序列
+        total_score: 题目总分序列
+    
+    Returns:
+        与输入等长的掌握程度float64数组
+    """
+    codes, uniques = pd.factorize(pd.Series(state).reset_index(drop=True))
+    labels = pd.Index(uniques).astype(str).str.strip()
+    kind = np.select(
+        [labels == 'Absolutely_Correct',
+         labels == 'Partially_Correct',
+         labels.str.startswith('Error') & (labels != 'Absolutely_Error')],
+        [_ABSOLUTELY_CORRECT, _PARTIALLY_CORRECT, _ERROR],
+        _OTHER,
+    )
+    # 缺失状态的编码为-1，对应追加在末尾的_OTHER
+    row_kind = np.append(kind, _OTHER)[codes]
+    
+    score = _to_float(score)
+    total_score = _to_float(total_score)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score_ratio = np.where(total_score > 0, score / total_score, 0.0)
+    
+    mastery = np.select(
+        [row_kind == _ABSOLUTELY_CORRECT, row_kind == _PARTIALLY_CORRECT, row_kind == _ERROR],
+        [1.0, score_ratio, 0.1 + 0.2 * score_ratio],
+        0.0,
+    )
+    mastery[(codes < 0) | np.isnan(score) | np.isnan(total_score)] = 0.0
+    return mastery
+
+
+def title_total_scores(title_info):
+    """
+    题目ID到总分的映射，同一题目有多条记录（多个知识点）时取最大分数
+    
+    Args:
+        title_info: 题目信息DataFrame，包含title_ID和score列
+    
+    Returns:
+        以title_ID为索引的总分Series
+    """
+    return title_info.groupby('title_ID', sort=False)['score'].max()
+
+
+def submission_total_scores(submissions, title_scores):
+    """
+    提交记录对应的题目总分，未知题目的总分按0处理
+    
+    Args:
+        submissions: 提交记录DataFrame，包含title_ID列
+        title_scores: title_total_scores返回的题目总分映射
+    
+    Returns:
+        与提交记录等长的总分Series
+    """
+    title_ids = submissions['title_ID'].astype(object)
+    return title_ids.map(title_scores).where(title_ids.isin(title_scores.index), 0)
+
+
+def compute_submission_mastery(submissions, title_scores):
+    """
+    计算提交记录的掌握程度列
+    
+    Args:
+        submissions: 提交记录DataFrame，包含title_ID、state和score列
+        title_scores: title_total_scores返回的题目总分映射
+    
+    Returns:
+        掌握程度float64数组
+    """
+    total_score = submission_total_scores(submissions, title_scores)
+    return compute_mastery(submissions['state'], submissions['score'], total_score)
+
+
+def verify_mastery(state, score, total_score):
+    """
+    校验向量化结果与逐行标量计算结果是否一致
+    
+    Returns:
+        不一致的行号数组，为空表示完全一致
+    """
+    vectorized = compute_mastery(state, score, total_score)
+    scalar = np.array([calculate_mastery(s, v, t) for s, v, t in
+                       zip(pd.Series(state), pd.Series(score), pd.Series(total_score))], dtype=np.float64)
+    return np.flatnonzero(vectorized != scalar)
+
+
+def main():
+    default_data_dir = Path(__file__).resolve().parents[2] / 'Data'
+    parser = argparse.ArgumentParser(description='校验向量化掌握度计算与逐行计算结果一致')
+    parser.add_argument('--data-dir', default=str(default_data_dir), help='数据根目录（包含Data_SubmitRecord）')
+    args = parser.parse_args()
+    
+    data_dir = Path(args.data_dir)
+    title_scores = title_total_scores(pd.read_csv(data_dir / 'Data_TitleInfo.csv'))
+    submit_files = sorted((data_dir / 'Data_SubmitRecord').glob('SubmitRecord-*.csv'))
+    
+    total_rows = 0
+    total_mismatches = 0
+    for file_path in submit_files:
+        df = pd.read_csv(file_path)
+        total_score = submission_total_scores(df, title_scores)
+        
+        start = time.perf_counter()
+        compute_submission_mastery(df, title_scores)
+        vectorized_elapsed = time.perf_counter() - start
+        
+        mismatches = verify_mastery(df['state'], df['score'], total_score)
+        total_rows += len(df)
+        total_mismatches += len(mismatches)
+        print(f"  - {file_path.name}: {len(df)}条, 向量化耗时{vectorized_elapsed * 1000:.1f}ms, 不一致{len(mismatches)}条")
+    
+    print(f"共校验{total_rows}条记录，不一致{total_mismatches}条")
+    return 0 if total_mismatches == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
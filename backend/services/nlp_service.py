@@ -12,17 +12,18 @@ import pandas as pd
 import numpy as np
 from typing import List, Dict, Optional
 
-from services.data_service import DataService
+from services.data_service import get_data_service
 from services.analysis_service import AnalysisService
 from services.report_service import ReportService
 
 # API配置将通过参数传入或使用环境变量默认值
 
 class NLPService:
-    def __init__(self, api_key=None, base_url=None):
-        self.data_service = DataService()
-        self.analysis_service = AnalysisService()
-        self.report_service = ReportService()
+    def __init__(self, api_key=None, base_url=None, analysis_service=None, report_service=None):
+        # 默认使用进程内共享的数据服务，分析和报告服务可由调用方复用
+        self.data_service = get_data_service()
+        self.analysis_service = analysis_service or AnalysisService(self.data_service)
+        self.report_service = report_service or ReportService(self.data_service, self.analysis_service)
         
         # API配置：优先使用传入参数，否则使用环境变量默认值
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
@@ -12,7 +12,7 @@ import base64
 from io import BytesIO
 import re
 from matplotlib.font_manager import FontProperties
-from services.data_service import DataService
+from services.data_service import get_data_service
 from services.analysis_service import AnalysisService
 
 # 设置中文字体
@@ -41,9 +41,10 @@ except Exception as e:
     print(f"注册中文字体失败: {e}, PDF中的中文可能无法正确显示")
 
 class ReportService:
-    def __init__(self):
-        self.data_service = DataService()
-        self.analysis_service = AnalysisService()
+    def __init__(self, data_service=None, analysis_service=None):
+        # 默认使用进程内共享的数据服务
+        self.data_service = data_service or get_data_service()
+        self.analysis_service = analysis_service or AnalysisService(self.data_service)
         
         # 报告保存目录
         self.report_dir = Path(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) / 'reports'
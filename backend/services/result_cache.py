@@ -0,0 +1,124 @@
+# 结果缓存模块 - 按数据版本缓存分析结果，带条目数和字节数上限的LRU
+
+import pickle
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """分析结果的LRU缓存
+
+    缓存键包含方法名、参数和数据版本，数据变化后旧版本的结果不会再被命中；
+    数据服务重新加载时还会通过invalidate()主动清空。条目数或总字节数超过上限时
+    淘汰最久未使用的结果。缓存的结果为共享对象，调用方不得原地修改。
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        """
+        Args:
+            max_entries: 最大缓存条目数
+            max_bytes: 缓存结果的最大总字节数（按pickle序列化大小估算）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # 缓存键 -> (结果, 字节数)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """读取缓存结果，命中时将其标记为最近使用"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """写入缓存结果，超过上限时淘汰最久未使用的条目
+
+        Returns:
+            是否写入（单个结果超过字节上限时不缓存）
+        """
+        try:
+            size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return False
+        if size > self.max_bytes:
+            return False
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return True
+
+    def invalidate(self):
+        """清空全部缓存结果"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """缓存的命中、未命中、淘汰次数及当前占用"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+def cached_result(func):
+    """缓存分析方法结果的装饰器
+
+    用于带有data_service和result_cache属性的服务方法，缓存键为
+    (方法名, 补全默认值后的参数, 数据版本)。只缓存status为success且计算前后
+    数据版本未变化的结果，参数不可哈希或未配置缓存时直接计算。
+    """
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cache = getattr(self, 'result_cache', None)
+        if cache is None:
+            return func(self, *args, **kwargs)
+
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = tuple(bound.arguments.items())[1:]
+
+        # 先检查数据文件是否变化，保证数据版本是最新的
+        self.data_service.refresh_if_changed()
+        key = (func.__name__, arguments, self.data_service.data_version)
+        try:
+            hash(key)
+        except TypeError:
+            return func(self, *args, **kwargs)
+
+        result = cache.get(key)
+        if result is None:
+            result = func(self, *args, **kwargs)
+            # 计算期间数据已更新时，结果可能来自新版本的数据，不能存入旧版本的键
+            if (isinstance(result, dict) and result.get('status') == 'success'
+                    and self.data_service.data_version == key[2]):
+                cache.put(key, result)
+        return result
+
+    return wrapper
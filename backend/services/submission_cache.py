@@ -0,0 +1,213 @@
+# 提交记录缓存模块 - 将SubmitRecord CSV缓存为二进制列式文件，加快冷启动加载
+
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+import pandas as pd
+from pathlib import Path
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'feather'
+except ImportError:
+    # 未安装pyarrow时退回pickle格式，同样避免重复解析CSV文本
+    CACHE_FORMAT = 'pickle'
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def read_submission_csv(file_path):
+    """解析提交记录CSV，安装pyarrow时使用多线程的pyarrow解析引擎（解析期间释放GIL）
+
+    数据服务加载和命令行预构建缓存都使用此函数，保证写入缓存的列类型一致。
+    """
+    if CACHE_FORMAT == 'feather':
+        return pd.read_csv(file_path, engine='pyarrow')
+    return pd.read_csv(file_path)
+
+
+def file_sha256(file_path, chunk_size=1 << 20):
+    """计算文件内容的SHA-256哈希"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SubmissionCache:
+    """SubmitRecord CSV的列式磁盘缓存
+
+    缓存文件与清单(manifest.json)保存在缓存目录中，清单记录源CSV的大小、
+    修改时间和内容哈希。源文件未变化时直接读取缓存，变化后自动重建。
+    """
+
+    def __init__(self, cache_dir, verify_hash=False):
+        """
+        Args:
+            cache_dir: 缓存目录
+            verify_hash: 为True时即使大小和修改时间一致也校验内容哈希
+        """
+        self.cache_dir = Path(cache_dir)
+        self.verify_hash = verify_hash
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        """读取缓存清单"""
+        manifest_path = self.cache_dir / MANIFEST_NAME
+        try:
+            with open(manifest_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_manifest(self):
+        """原子写入缓存清单（临时文件+重命名）"""
+        manifest_path = self.cache_dir / MANIFEST_NAME
+        tmp_path = manifest_path.with_name(f'{MANIFEST_NAME}.{os.getpid()}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    def _cache_path(self, csv_path):
+        suffix = '.feather' if CACHE_FORMAT == 'feather' else '.pkl'
+        return self.cache_dir / (Path(csv_path).stem + suffix)
+
+    def is_fresh(self, csv_path):
+        """判断源CSV对应的缓存是否仍然有效"""
+        csv_path = Path(csv_path)
+        entry = self._manifest.get(csv_path.name)
+        if not entry or entry.get('format') != CACHE_FORMAT:
+            return False
+        if not self._cache_path(csv_path).exists():
+            return False
+
+        stat = csv_path.stat()
+        if stat.st_size != entry['size']:
+            return False
+        if stat.st_mtime_ns == entry['mtime_ns'] and not self.verify_hash:
+            return True
+
+        # 修改时间变化（如重新检出）但内容未变时仍可复用缓存
+        if file_sha256(csv_path) != entry['sha256']:
+            return False
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            with self._lock:
+                entry['mtime_ns'] = stat.st_mtime_ns
+                self._write_manifest()
+        return True
+
+    def load(self, csv_path, reader=read_submission_csv):
+        """读取提交记录，优先使用缓存
+
+        Args:
+            csv_path: 源CSV路径
+            reader: 缓存失效时用于解析CSV的函数
+
+        Returns:
+            提交记录DataFrame
+        """
+        csv_path = Path(csv_path)
+        cache_path = self._cache_path(csv_path)
+        if self.is_fresh(csv_path):
+            try:
+                if CACHE_FORMAT == 'feather':
+                    return pd.read_feather(cache_path)
+                return pd.read_pickle(cache_path)
+            except Exception as e:
+                print(f"读取缓存{cache_path.name}失败，将重新解析CSV: {e}")
+
+        # 先记录源文件签名再解析，避免解析期间文件被修改导致清单与缓存不一致
+        signature = self._signature(csv_path)
+        df = reader(csv_path)
+        self.store(csv_path, df, signature)
+        return df
+
+    def _signature(self, csv_path):
+        stat = Path(csv_path).stat()
+        return stat.st_size, stat.st_mtime_ns, file_sha256(csv_path)
+
+    def store(self, csv_path, df, signature=None):
+        """将解析后的数据写入缓存并更新清单"""
+        csv_path = Path(csv_path)
+        cache_path = self._cache_path(csv_path)
+        size, mtime_ns, sha256 = signature or self._signature(csv_path)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+            if CACHE_FORMAT == 'feather':
+                df.reset_index(drop=True).to_feather(tmp_path)
+            else:
+                df.to_pickle(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"写入缓存{cache_path.name}失败: {e}")
+            return False
+
+        with self._lock:
+            self._manifest[csv_path.name] = {
+                'size': size,
+                'mtime_ns': mtime_ns,
+                'sha256': sha256,
+                'format': CACHE_FORMAT,
+                'rows': len(df),
+            }
+            self._write_manifest()
+        return True
+
+    def build(self, csv_paths, force=False):
+        """预先构建缓存
+
+        Args:
+            csv_paths: 需要缓存的CSV路径列表
+            force: 为True时忽略现有缓存全部重建
+
+        Returns:
+            每个文件的处理结果列表
+        """
+        results = []
+        for csv_path in csv_paths:
+            csv_path = Path(csv_path)
+            start = time.perf_counter()
+            if not force and self.is_fresh(csv_path):
+                action = 'fresh'
+                rows = self._manifest[csv_path.name]['rows']
+            else:
+                signature = self._signature(csv_path)
+                df = read_submission_csv(csv_path)
+                action = 'built' if self.store(csv_path, df, signature) else 'failed'
+                rows = len(df)
+            results.append({
+                'file': csv_path.name,
+                'action': action,
+                'rows': rows,
+                'elapsed': time.perf_counter() - start,
+            })
+        return results
+
+
+def main():
+    default_data_dir = Path(__file__).resolve().parents[2] / 'Data'
+    parser = argparse.ArgumentParser(description='预构建SubmitRecord提交记录的列式缓存')
+    parser.add_argument('--data-dir', default=str(default_data_dir), help='数据根目录（包含Data_SubmitRecord）')
+    parser.add_argument('--force', action='store_true', help='忽略现有缓存，全部重建')
+    parser.add_argument('--verify', action='store_true', help='校验源文件内容哈希')
+    args = parser.parse_args()
+
+    data_dir = Path(args.data_dir)
+    csv_paths = sorted((data_dir / 'Data_SubmitRecord').glob('SubmitRecord-*.csv'))
+    cache = SubmissionCache(data_dir / 'Cache' / 'SubmitRecord', verify_hash=args.verify)
+
+    print(f"缓存格式: {CACHE_FORMAT}，共 {len(csv_paths)} 个提交记录文件")
+    start = time.perf_counter()
+    for result in cache.build(csv_paths, force=args.force):
+        print(f"  - {result['file']}: {result['action']}, {result['rows']}条, {result['elapsed'] * 1000:.1f}ms")
+    print(f"完成，总耗时 {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+# 数据服务追加测试 - 追加提交记录增量更新快照，追加期间并发读取应始终看到一致的快照
+
+import os
+import sys
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.data_service import DataService
+
+DATA_DIR = Path(__file__).resolve().parents[2] / 'Data'
+CLASS_IDS = ['Class1', 'Class2']
+APPEND_COUNT = 15
+READER_COUNT = 4
+
+
+@pytest.fixture
+def data_service(tmp_path):
+    """使用数据文件副本的数据服务，追加记录不修改原始数据"""
+    if not (DATA_DIR / 'Data_SubmitRecord').exists():
+        pytest.skip('缺少Data目录')
+    shutil.copy(DATA_DIR / 'Data_StudentInfo.csv', tmp_path)
+    shutil.copy(DATA_DIR / 'Data_TitleInfo.csv', tmp_path)
+    (tmp_path / 'Data_SubmitRecord').mkdir()
+    for class_id in CLASS_IDS:
+        shutil.copy(DATA_DIR / 'Data_SubmitRecord' / f'SubmitRecord-{class_id}.csv', tmp_path / 'Data_SubmitRecord')
+    service = DataService(load_workers=1, data_dir=tmp_path)
+    service.refresh_interval = None
+    return service
+
+
+def test_append_extends_snapshot_without_reloading(data_service):
+    data_service.get_fact_table()
+    template = data_service.to_records(data_service.get_submissions_df('Class2').iloc[:2])
+    records = [{field: record[field] for field in
+                ['class', 'state', 'score', 'title_ID', 'method', 'memory', 'timeconsume', 'student_ID']}
+               for record in template]
+    for i, record in enumerate(records):
+        record['time'] = int(template[i]['time']) + i + 1
+    # 新学生、新班级和不可解析的耗时，覆盖词表扩展和新增班级文件
+    records.append(dict(records[0], student_ID='0000_new_student', timeconsume='--'))
+    records.append(dict(records[1], **{'class': 'Class9'}))
+
+    reads = []
+    read_file = data_service._read_submissions_file
+    data_service._read_submissions_file = lambda class_id: (reads.append(class_id), read_file(class_id))[1]
+    result = data_service.append_submissions(records)
+    assert result['status'] == 'success'
+    snapshot = data_service._get_snapshot()
+    assert reads == []
+    assert snapshot.version == data_service.data_version
+
+    # 增量得到的快照与按文件重新构建的快照一致（各班级的行顺序与文件一致）
+    rebuilt = DataService(load_workers=1, data_dir=data_service.data_dir)
+    expected = rebuilt._get_snapshot()
+    for column, vocabulary in expected.vocabularies.items():
+        assert snapshot.vocabularies[column].equals(vocabulary)
+    for class_id in rebuilt.get_class_ids():
+        pd.testing.assert_frame_equal(data_service.get_submissions_df(class_id).reset_index(drop=True),
+                                      rebuilt.get_submissions_df(class_id).reset_index(drop=True))
+    codes = snapshot.submissions['student_ID'].cat.codes.to_numpy()
+    for student_id in ['0000_new_student', records[0]['student_ID']]:
+        rows = snapshot.student_rows(student_id)
+        assert np.array_equal(rows, np.flatnonzero(codes == snapshot.encode('student_ID', student_id)))
+
+    fact = data_service.get_fact_table()
+    assert len(fact) == len(rebuilt.get_fact_table())
+    assert (fact['submission_row'].iloc[:len(snapshot.submissions)].to_numpy()
+            == np.arange(len(snapshot.submissions))).all()
+    keys = ['class', 'index', 'knowledge', 'sub_knowledge']
+    for student_id in ['0000_new_student', records[0]['student_ID']]:
+        actual = data_service.get_fact_table(student_id).drop(columns='submission_row')
+        rebuilt_fact = rebuilt.get_fact_table(student_id).drop(columns='submission_row')
+        pd.testing.assert_frame_equal(actual.sort_values(keys).reset_index(drop=True),
+                                      rebuilt_fact.sort_values(keys).reset_index(drop=True))
+
+
+def test_append_is_atomic_for_concurrent_readers(data_service):
+    submissions = data_service.get_submissions_df('Class1')
+    template = data_service.to_records(submissions.iloc[:1])[0]
+    student_id = template['student_ID']
+    base_count = len(data_service.get_submissions_df(student_id=student_id))
+    base_fact_count = len(data_service.get_fact_table(student_id))
+
+    errors = []
+    stop = threading.Event()
+
+    def read():
+        try:
+            while not stop.is_set():
+                page = data_service.get_submission_page({'student_id': student_id}, limit=1000)
+                assert page['status'] == 'success'
+                assert base_count <= page['total'] <= base_count + APPEND_COUNT
+                assert len(page['records']) == page['total']
+                assert all(record['student_ID'] == student_id for record in page['records'])
+
+                fact = data_service.get_fact_table(student_id)
+                assert base_fact_count <= len(fact) <= base_fact_count + APPEND_COUNT * 2
+                assert (fact['student_ID'] == student_id).all()
+
+                class_rows = data_service.get_submissions_df('Class1', student_id)
+                assert (class_rows['student_ID'] == student_id).all()
+        except Exception as e:
+            errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(READER_COUNT)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(APPEND_COUNT):
+            record = {field: template[field] for field in
+                      ['class', 'state', 'score', 'title_ID', 'method', 'memory', 'timeconsume', 'student_ID']}
+            record['time'] = int(template['time']) + i + 1
+            result = data_service.append_submissions([record])
+            assert result['status'] == 'success'
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert not errors, errors
+
+    # 追加完成后学生的提交记录、事实行和分页结果都包含全部新记录
+    assert len(data_service.get_submissions_df(student_id=student_id)) == base_count + APPEND_COUNT
+    assert len(data_service.get_submission_facts(student_id)) == base_count + APPEND_COUNT
+    assert len(data_service.get_fact_table(student_id)) > base_fact_count
+    fact = data_service.get_fact_table()
+    assert (fact.iloc[:len(data_service.get_all_submissions_df())]['time'].to_numpy()
+            == data_service.get_all_submissions_df()['time'].to_numpy()).all()
+    page = data_service.get_submission_page({'student_id': student_id}, limit=1000)
+    assert page['total'] == base_count + APPEND_COUNT
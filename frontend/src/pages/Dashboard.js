@@ -37,34 +37,19 @@ const Dashboard = () => {
       try {
         setLoading(true);
         
-        // 获取学生数据
-        const studentsResponse = await axios.get('/api/students');
-        
-        // 获取题目数据
-        const questionsResponse = await axios.get('/api/questions');
-        
-        // 获取所有班级的提交记录数据
-        const submissionsResponse = await axios.get('/api/all_submissions');
-        
-        // 计算平均掌握程度
-        const submissions = submissionsResponse.data;
-        let averageMastery = 0;
-        if (submissions.length > 0) {
-          const masteryValues = submissions
-            .filter(s => s.Mastery !== undefined && s.Mastery !== null)
-            .map(s => parseFloat(s.Mastery));
-          if (masteryValues.length > 0) {
-            averageMastery = masteryValues.reduce((sum, val) => sum + val, 0) / masteryValues.length;
-          }
-        }
+        // 获取仪表盘概览（服务端汇总统计，无需下载全部提交记录）
+        const summaryResponse = await axios.get('/api/dashboard/summary');
+        const summary = summaryResponse.data.status === 'success' ? summaryResponse.data : null;
         
         // 更新统计数据
-        setStats({
-          totalStudents: studentsResponse.data.length,
-          totalQuestions: questionsResponse.data.length,
-          totalSubmissions: submissions.length,
-          averageMastery: averageMastery
-        });
+        if (summary) {
+          setStats({
+            totalStudents: summary.totals.students,
+            totalQuestions: summary.totals.questions,
+            totalSubmissions: summary.totals.submissions,
+            averageMastery: summary.totals.average_mastery
+          });
+        }
         
         // 获取知识点掌握度分析数据
         const knowledgeResponse = await axios.get('/api/analysis/knowledge');
@@ -80,22 +65,19 @@ const Dashboard = () => {
           setKnowledgeTreeData(knowledgeData);
         }
         
-        // 获取学习行为分析数据
-        const behaviorResponse = await axios.get('/api/analysis/behavior');
-        if (behaviorResponse.data.status === 'success') {
-          const behaviorProfile = behaviorResponse.data.behavior_profile;
-          
+        // 学习行为分布数据来自仪表盘概览
+        if (summary) {
           // 使用完整的24小时分布数据
-          const hourData = behaviorProfile.hour_distribution || [];
+          const hourData = summary.hour_distribution || [];
           
           // 处理状态分布数据
-          const stateData = Object.entries(behaviorProfile.state_distribution).filter(([key, value]) => !key.match(/[^\x00-\x7F]/)).map(([key, value]) => ({
+          const stateData = Object.entries(summary.state_distribution).filter(([key, value]) => !key.match(/[^\x00-\x7F]/)).map(([key, value]) => ({
             name: key,
             value: value
           }));
           
-          // 处理一周分布数据（从小时数据计算）
-          const weekData = calculateWeekDistribution(submissions);
+          // 处理一周分布数据
+          const weekData = calculateWeekDistribution(summary.weekday_distribution || []);
           
           setBehaviorData({
             hourDistribution: hourData,
@@ -115,26 +97,13 @@ const Dashboard = () => {
     fetchDashboardData();
   }, []);
   
-  // 计算一周分布数据
-  const calculateWeekDistribution = (submissions) => {
+  // 计算一周分布数据（服务端的星期分布为北京时间，0为周一）
+  const calculateWeekDistribution = (weekdayDistribution) => {
     const weekDays = ['周日', '周一', '周二', '周三', '周四', '周五', '周六'];
     const weekCounts = Array(7).fill(0);
     
-    submissions.forEach(submission => {
-      // 后端返回的时间字段是time，格式为Unix时间戳
-      if (submission.time) {
-        // 将Unix时间戳转换为毫秒，然后创建Date对象
-        // 由于时间戳是UTC时间，需要转换为北京时间（UTC+8）
-        const timestamp = parseFloat(submission.time) * 1000; // 转换为毫秒
-        const utcDate = new Date(timestamp);
-        
-        // 转换为北京时间（UTC+8）
-        const beijingOffset = 8 * 60 * 60 * 1000; // 8小时的毫秒数
-        const beijingDate = new Date(utcDate.getTime() + beijingOffset);
-        
-        const dayOfWeek = beijingDate.getDay(); // 0 = 周日, 1 = 周一, ..., 6 = 周六
-        weekCounts[dayOfWeek]++;
-      }
+    weekdayDistribution.forEach(item => {
+      weekCounts[(item.weekday + 1) % 7] = item.count;
     });
     
     return weekDays.map((day, index) => ({
@@ -21,11 +21,10 @@ const DifficultyAnalysis = () => {
       setLoading(true);
       setError(null);
       
-      // 并行获取所有数据
-      const [difficultyResponse, knowledgeResponse, subKnowledgeResponse] = await Promise.all([
+      // 并行获取难度分析和散点图数据（知识点、子知识点散点图由一个接口返回）
+      const [difficultyResponse, scatterResponse] = await Promise.all([
         axios.get('/api/analysis/difficulty'),
-        axios.get('/api/analysis/knowledge-scatter'),
-        axios.get('/api/analysis/sub-knowledge-scatter')
+        axios.get('/api/analysis/scatter')
       ]);
       
       if (difficultyResponse.data.status === 'success') {
@@ -35,12 +34,9 @@ const DifficultyAnalysis = () => {
         setError(difficultyResponse.data.message || '分析失败');
       }
       
-      if (knowledgeResponse.data.status === 'success') {
-        setKnowledgeScatterData(knowledgeResponse.data.knowledge_scatter_data || []);
-      }
-      
-      if (subKnowledgeResponse.data.status === 'success') {
-        setSubKnowledgeScatterData(subKnowledgeResponse.data.sub_knowledge_scatter_data || []);
+      if (scatterResponse.data.status === 'success') {
+        setKnowledgeScatterData(scatterResponse.data.knowledge_scatter_data || []);
+        setSubKnowledgeScatterData(scatterResponse.data.sub_knowledge_scatter_data || []);
       }
       
       setLoading(false);
@@ -163,9 +163,10 @@ const KnowledgeAnalysis = () => {
   // 获取时序数据
   const fetchTimeSeriesData = async () => {
     try {
+      // 全体学生的提交记录较多，由后端按天汇总为平均掌握度
       const url = selectedStudent 
         ? `/api/analysis/knowledge/timeseries?student_id=${selectedStudent}` 
-        : '/api/analysis/knowledge/timeseries';
+        : '/api/analysis/knowledge/timeseries?bucket=day';
       
       console.log('请求时序数据:', url);
       const response = await axios.get(url);
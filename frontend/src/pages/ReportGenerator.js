@@ -157,59 +157,69 @@ const ReportGenerator = () => {
       
       console.log('开始获取学生数据:', studentId);
       
-      // 获取知识掌握度分析
-      const knowledgeUrl = studentId 
-        ? `/api/analysis/knowledge?student_id=${studentId}` 
-        : '/api/analysis/knowledge';
-      console.log('请求知识点分析数据:', knowledgeUrl);
-      const knowledgeResponse = await axios.get(knowledgeUrl);
-      console.log('知识点分析响应:', knowledgeResponse.data);
+      let knowledgeResult = null;
+      let behaviorResult = null;
+      let timeSeriesData = null;
       
-      // 获取学习行为分析
-      const behaviorUrl = studentId 
-        ? `/api/analysis/behavior?student_id=${studentId}` 
-        : '/api/analysis/behavior';
-      console.log('请求学习行为分析数据:', behaviorUrl);
-      const behaviorResponse = await axios.get(behaviorUrl);
-      console.log('学习行为分析响应:', behaviorResponse.data);
+      if (studentId) {
+        // 单个学生的知识点、学习行为和时序数据通过批量分析接口一次获取
+        console.log('请求批量分析数据:', studentId);
+        const batchResponse = await axios.post('/api/analysis/batch', {
+          student_ids: [studentId],
+          analysis_types: ['knowledge', 'behavior', 'timeseries']
+        });
+        console.log('批量分析响应:', batchResponse.data);
+        const results = batchResponse.data.results?.[studentId] || {};
+        knowledgeResult = results.knowledge;
+        behaviorResult = results.behavior;
+        timeSeriesData = results.timeseries?.status === 'success' ? results.timeseries.timeseries_data : {};
+      } else {
+        // 获取知识掌握度分析
+        console.log('请求知识点分析数据');
+        const knowledgeResponse = await axios.get('/api/analysis/knowledge');
+        console.log('知识点分析响应:', knowledgeResponse.data);
+        knowledgeResult = knowledgeResponse.data;
+        
+        // 获取学习行为分析
+        console.log('请求学习行为分析数据');
+        const behaviorResponse = await axios.get('/api/analysis/behavior');
+        console.log('学习行为分析响应:', behaviorResponse.data);
+        behaviorResult = behaviorResponse.data;
+        
+        // 获取知识点时序数据
+        try {
+          console.log('请求时序数据');
+          const timeSeriesResponse = await axios.get('/api/analysis/knowledge/timeseries');
+          console.log('时序数据响应:', timeSeriesResponse.data);
+          
+          if (timeSeriesResponse.data.status === 'success') {
+            timeSeriesData = timeSeriesResponse.data.timeseries_data;
+          }
+        } catch (timeSeriesErr) {
+          console.warn('获取时序数据失败:', timeSeriesErr);
+          timeSeriesData = {};
+        }
+      }
       
       // 获取题目难度分析
       console.log('请求题目难度分析数据');
       const difficultyResponse = await axios.get('/api/analysis/difficulty');
       console.log('题目难度分析响应:', difficultyResponse.data);
       
-      // 获取知识点时序数据
-      let timeSeriesData = null;
-      try {
-        const timeSeriesUrl = studentId 
-          ? `/api/analysis/knowledge/timeseries?student_id=${studentId}` 
-          : '/api/analysis/knowledge/timeseries';
-        console.log('请求时序数据:', timeSeriesUrl);
-        const timeSeriesResponse = await axios.get(timeSeriesUrl);
-        console.log('时序数据响应:', timeSeriesResponse.data);
-        
-        if (timeSeriesResponse.data.status === 'success') {
-          timeSeriesData = timeSeriesResponse.data.timeseries_data;
-        }
-      } catch (timeSeriesErr) {
-        console.warn('获取时序数据失败:', timeSeriesErr);
-        timeSeriesData = {};
-      }
-      
       // 获取学生基本信息
       const studentInfo = students.find(s => s.student_ID === studentId);
       
       const combinedData = {
         studentInfo,
-        knowledge: knowledgeResponse.data.status === 'success' ? {
-          knowledge_mastery: knowledgeResponse.data.knowledge_mastery,
-          weak_points: knowledgeResponse.data.weak_points || [],
-          overall_averages: knowledgeResponse.data.overall_averages || {},
+        knowledge: knowledgeResult?.status === 'success' ? {
+          knowledge_mastery: knowledgeResult.knowledge_mastery,
+          weak_points: knowledgeResult.weak_points || [],
+          overall_averages: knowledgeResult.overall_averages || {},
           timeseries_data: timeSeriesData
         } : null,
-        behavior: behaviorResponse.data.status === 'success' ? {
-          behavior_profile: behaviorResponse.data.behavior_profile,
-          submission_timeline: behaviorResponse.data.submission_timeline || []
+        behavior: behaviorResult?.status === 'success' ? {
+          behavior_profile: behaviorResult.behavior_profile,
+          submission_timeline: behaviorResult.submission_timeline || []
         } : null,
         difficulty: difficultyResponse.data.status === 'success' ? difficultyResponse.data : null
       };